@@ -0,0 +1,5 @@
+"""
+Micro benchmarks for the engine.
+
+Run them from the game directory, i.e. python -m benchmarks.pathfind
+"""
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+"""
+Raises many Collision and Separation events on an EventBus, like a
+crowded room, and looks up the events of every entity each frame.
+
+The number of event records made is printed for the first frame and for
+the rest of them; once the pool is filled it should be zero.
+
+Usage:
+
+python -m benchmarks.events [--entities=500] [--events=2000] [--frames=200]
+"""
+
+from argparse import ArgumentParser
+import random
+import time
+
+from zort.events import EventBus
+
+
+class Entity(object):
+    pass
+
+
+def main(args):
+    random.seed(args.seed)
+    entities = [Entity() for i in range(args.entities)]
+    bus = EventBus()
+
+    first_frame = 0
+    later_frames = 0
+    delivered = 0
+    start_time = time.time()
+    for frame in range(args.frames):
+        bus.advance()
+        # about the same number of events each frame
+        count = args.events + random.randint(-10, 10)
+        for i in range(count):
+            left, right = random.sample(entities, 2)
+            name = "Collision" if i % 2 else "Separation"
+            bus.raise_contact("PhysicsGroup", name, left, right)
+
+        for entity in entities:
+            for event in bus.addressed(entity, "Collision"):
+                if event.other(entity) is not None:
+                    delivered += 1
+            delivered += len(bus.addressed(entity, "Separation"))
+
+        if frame < 2:
+            first_frame += bus.allocations
+        else:
+            later_frames += bus.allocations
+    elapsed = (time.time() - start_time) * 1000.
+
+    print("%d entities, %d events/frame for %d frames" %
+          (args.entities, args.events, args.frames))
+    print("%10.2f ms/frame %8d delivered/frame" %
+          (elapsed / args.frames, delivered // args.frames))
+    print("records made: %d in the first two frames, %d after them, "
+          "%d in the pool" % (first_frame, later_frames, bus.pool_size))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        prog="benchmarks.events",
+        description="Benchmark the pooled EventBus")
+
+    parser.add_argument(
+        "--entities", required=False, default=500, type=int,
+        help="Number of entities taking part in events")
+
+    parser.add_argument(
+        "--events", required=False, default=2000, type=int,
+        help="Number of events raised each frame")
+
+    parser.add_argument(
+        "--frames", required=False, default=200, type=int,
+        help="Number of frames to run")
+
+    parser.add_argument(
+        "--seed", required=False, default=19, type=int,
+        help="Seed for the events")
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+"""
+Compares the cost per frame of seekers each running their own search
+against seekers sharing one flow field toward the hero, built over the
+whole map or only as far as the seekers reach.
+
+The hero moves to a neighboring cell every few frames, and every seeker
+asks for its next step each frame.  Seekers start within reach of the
+hero, as they only chase it from there.
+
+The time to build the pathfinder, and to build each kind of field, is
+printed for each map size; a full field is built over the whole map
+every time the hero changes cell.
+
+Usage:
+
+python -m benchmarks.flowfield [--sizes 40 200] [--frames=120] [--reach=10]
+"""
+
+from argparse import ArgumentParser
+import random
+import time
+
+from zort.environ.maze import new_maze
+from zort.hex_model import ArrayHexMapModel
+from zort.pathfinding import FlowField
+
+
+def search_step(model, current, end, reach):
+    path = model.pathfind(current, end)[0]
+    return path[-1] if path else None
+
+
+def field_step(model, current, end, reach):
+    return model.next_step(current, end)
+
+
+def bounded_step(model, current, end, reach):
+    return model.next_step(current, end, reach=reach)
+
+
+def run(model, seekers, start, region, frames, reach, step):
+    random.seed(0)
+    model._flow_fields = dict()
+    hero = start
+    positions = [random.choice(region) for i in range(seekers)]
+    start_time = time.time()
+    for frame in range(frames):
+        if frame % 4 == 0:
+            neighbors = list(model.surrounding(hero))
+            if neighbors:
+                hero = random.choice(neighbors)
+        for position in positions:
+            step(model, position, hero, reach)
+    return (time.time() - start_time) * 1000. / frames
+
+
+def time_builds(model, walkable, reach, builds=10):
+    """:return: ms per full build and per bounded build
+    """
+    index_of = model.index_of
+    goals = [index_of(random.choice(walkable)) for i in range(builds)]
+    field = FlowField(model.pathfinder)
+    result = list()
+    for limit in (None, reach):
+        start_time = time.time()
+        for goal in goals:
+            field.build(goal, True, model.version, limit)
+        result.append((time.time() - start_time) * 1000. / builds)
+    return result
+
+
+def main(args):
+    for size in args.sizes:
+        random.seed(args.seed)
+        model = new_maze(map_width=size, map_height=size,
+                         num_adjacent=args.num_adjacent,
+                         model_class=ArrayHexMapModel)
+        walkable = [coords for coords, cell in model.cells
+                    if not cell.raised]
+
+        start_time = time.time()
+        pathfinder = model.pathfinder
+        built = (time.time() - start_time) * 1000.
+        full, bounded = time_builds(model, walkable, args.reach)
+
+        start = walkable[len(walkable) // 2]
+        region = pathfinder.within_radius(model.index_of(start), args.reach)
+        region = [model.coords_of(index) for index in sorted(region)]
+
+        print("%dx%d maze: pathfinder %.1f ms, field build %.2f ms full, "
+              "%.2f ms to reach %d" %
+              (size, size, built, full, bounded, args.reach))
+        print("%d frames, ms per frame" % args.frames)
+        print("%8s %12s %12s %12s" %
+              ("seekers", "search", "full field", "bounded"))
+        for seekers in args.seekers:
+            times = [run(model, seekers, start, region, args.frames,
+                         args.reach, step)
+                     for step in (search_step, field_step, bounded_step)]
+            print("%8d %12.3f %12.3f %12.3f" % ((seekers,) + tuple(times)))
+        print("")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        prog="benchmarks.flowfield",
+        description="Benchmark shared flow fields for seeking enemies")
+
+    parser.add_argument(
+        "--sizes", required=False, default=[40, 200], type=int,
+        nargs="+", help="Widths and heights of the maps in hex tiles")
+
+    parser.add_argument(
+        "--num-adjacent", required=False, default=2, type=int,
+        help="Passed to the maze generator")
+
+    parser.add_argument(
+        "--frames", required=False, default=120, type=int,
+        help="Number of frames to simulate")
+
+    parser.add_argument(
+        "--seekers", required=False, default=[5, 50, 500], type=int,
+        nargs="+", help="Numbers of seekers to test")
+
+    parser.add_argument(
+        "--reach", required=False, default=10, type=int,
+        help="Cells from the hero that seekers chase it from, like "
+             "ramble_radius plus follow_persistence")
+
+    parser.add_argument(
+        "--seed", required=False, default=19, type=int,
+        help="Seed for the maze")
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+"""
+Compares flat A* from the PathFinder against the ClusterGraph (HPA*) on a
+large maze: time to build the graph, time and nodes expanded per search,
+how much longer the paths are, and the cost of rebuilding after cells
+change.
+
+Usage:
+
+python -m benchmarks.hierarchy [--width=200] [--height=200] [--searches=100]
+"""
+
+from argparse import ArgumentParser
+import random
+import time
+
+from zort.environ.maze import new_maze
+from zort.hex_model import ArrayHexMapModel
+from zort.hierarchy import ClusterGraph
+
+
+def path_cost(model, path):
+    if path is None:
+        return 0
+    return sum(1 + model.cost_col[index] for index in path)
+
+
+def main(args):
+    random.seed(args.seed)
+    model = new_maze(map_width=args.width, map_height=args.height,
+                     num_adjacent=args.num_adjacent,
+                     model_class=ArrayHexMapModel)
+    pathfinder = model.pathfinder
+
+    walkable = [index for index in model.indexes()
+                if not model.raised_col[index]]
+    pairs = list()
+    while len(pairs) < args.searches:
+        start, goal = random.sample(walkable, 2)
+        if pathfinder.distance(start, goal) >= args.min_distance:
+            pairs.append((start, goal))
+
+    print("%d searches on %dx%d maze, clusters of %d" %
+          (args.searches, args.width, args.height, args.cluster_size))
+
+    start_time = time.time()
+    graph = ClusterGraph(pathfinder, args.cluster_size)
+    graph.search(*pairs[0])
+    elapsed = (time.time() - start_time) * 1000.
+    print("build    %10.2f ms %8d entrances" % (elapsed, len(graph.intra)))
+
+    flat_paths = list()
+    expanded = 0
+    start_time = time.time()
+    for start, goal in pairs:
+        flat_paths.append(pathfinder.search(start, goal))
+        expanded += pathfinder.expanded
+    elapsed = (time.time() - start_time) * 1000.
+    print("flat     %10.2f ms/search %8d nodes/search" %
+          (elapsed / len(pairs), expanded // len(pairs)))
+
+    hierarchy_paths = list()
+    expanded = 0
+    start_time = time.time()
+    for start, goal in pairs:
+        hierarchy_paths.append(graph.search(start, goal))
+        expanded += graph.expanded
+    elapsed = (time.time() - start_time) * 1000.
+    print("cluster  %10.2f ms/search %8d nodes/search" %
+          (elapsed / len(pairs), expanded // len(pairs)))
+
+    ratios = list()
+    for flat, path in zip(flat_paths, hierarchy_paths):
+        if flat is not None and path is not None:
+            ratios.append(path_cost(model, path) /
+                          float(path_cost(model, flat)))
+    if ratios:
+        print("path cost vs flat: %.3f mean %.3f worst" %
+              (sum(ratios) / len(ratios), max(ratios)))
+
+    # toggle cells, like doors, and rebuild only the clusters they touch
+    indexes = list(model.indexes())
+    start_time = time.time()
+    for i in range(args.changes):
+        index = random.choice(indexes)
+        model.raised_col[index] = not model.raised_col[index]
+        graph.cell_changed(index)
+        graph.search(*pairs[i % len(pairs)])
+    elapsed = (time.time() - start_time) * 1000.
+    print("change   %10.2f ms/change, including one search" %
+          (elapsed / args.changes))
+
+    start_time = time.time()
+    ClusterGraph(pathfinder, args.cluster_size).search(*pairs[0])
+    elapsed = (time.time() - start_time) * 1000.
+    print("rebuild  %10.2f ms for the whole graph" % elapsed)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        prog="benchmarks.hierarchy",
+        description="Benchmark hierarchical pathfinding")
+
+    parser.add_argument(
+        "--width", required=False, default=200, type=int,
+        help="The width of the map in hex tiles")
+
+    parser.add_argument(
+        "--height", required=False, default=200, type=int,
+        help="The height of the map in hex tiles")
+
+    parser.add_argument(
+        "--num-adjacent", required=False, default=2, type=int,
+        help="Passed to the maze generator")
+
+    parser.add_argument(
+        "--cluster-size", required=False, default=10, type=int,
+        help="Width and height of a cluster in hex tiles")
+
+    parser.add_argument(
+        "--searches", required=False, default=100, type=int,
+        help="Number of random searches to run")
+
+    parser.add_argument(
+        "--min-distance", required=False, default=50, type=int,
+        help="Shortest distance between endpoints of a search")
+
+    parser.add_argument(
+        "--changes", required=False, default=50, type=int,
+        help="Number of cells to toggle")
+
+    parser.add_argument(
+        "--seed", required=False, default=19, type=int,
+        help="Seed for the maze and the endpoints")
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+"""
+Compares nodes expanded per millisecond of the dict-backed search in
+HexMapModel.pathfind against the indexed PathFinder used by
+ArrayHexMapModel.pathfind.
+
+Usage:
+
+python -m benchmarks.pathfind [--width=40] [--height=40] [--searches=200]
+"""
+
+from argparse import ArgumentParser
+import random
+import time
+
+from zort.environ.maze import new_maze
+from zort.hex_model import HexMapModel, ArrayHexMapModel
+
+
+class CountingHexMapModel(HexMapModel):
+    """HexMapModel that counts expanded nodes
+    """
+    expanded = 0
+
+    def surrounding(self, coords, avoid_raised=True):
+        self.expanded += 1
+        return super(CountingHexMapModel, self).surrounding(
+            coords, avoid_raised)
+
+
+def run(name, model, pairs, expanded):
+    complete = 0
+    found = 0
+    start_time = time.time()
+    for start, end in pairs:
+        path, done = model.pathfind(start, end)
+        complete += done
+        found += path is not None
+    elapsed = (time.time() - start_time) * 1000.
+    nodes = expanded()
+    print("%-8s %8d nodes %10.2f ms %10.2f nodes/ms "
+          "%5d found %5d complete" %
+          (name, nodes, elapsed, nodes / elapsed, found, complete))
+
+
+def main(args):
+    random.seed(args.seed)
+    maze = new_maze(map_width=args.width, map_height=args.height,
+                    num_adjacent=args.num_adjacent)
+
+    legacy = CountingHexMapModel()
+    legacy.add_cells(maze.cells)
+    indexed = ArrayHexMapModel()
+    indexed.hierarchy_distance = None
+    indexed.add_cells(maze.cells)
+
+    walkable = [coords for coords, cell in maze.cells if not cell.raised]
+    pairs = [random.sample(walkable, 2) for i in range(args.searches)]
+
+    print("%d searches on %dx%d maze" %
+          (args.searches, args.width, args.height))
+
+    run("dict", legacy, pairs, lambda: legacy.expanded)
+
+    counter = [0]
+
+    def counting_search(*search_args):
+        path = search(*search_args)
+        counter[0] += indexed.pathfinder.expanded
+        return path
+
+    search = indexed.pathfinder.search
+    indexed.pathfinder.search = counting_search
+    run("indexed", indexed, pairs, lambda: counter[0])
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        prog="benchmarks.pathfind",
+        description="Benchmark HexMapModel pathfinding")
+
+    parser.add_argument(
+        "--width", required=False, default=40, type=int,
+        help="The width of the map in hex tiles")
+
+    parser.add_argument(
+        "--height", required=False, default=40, type=int,
+        help="The height of the map in hex tiles")
+
+    parser.add_argument(
+        "--num-adjacent", required=False, default=2, type=int,
+        help="Passed to the maze generator")
+
+    parser.add_argument(
+        "--searches", required=False, default=200, type=int,
+        help="Number of random searches to run")
+
+    parser.add_argument(
+        "--seed", required=False, default=19, type=int,
+        help="Seed for the maze and the endpoints")
+
+    args = parser.parse_args()
+    main(args)
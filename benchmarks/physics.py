@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+
+"""
+Stress test of PhysicsGroup with many bouncing rocks, comparing collision
+checks against every sprite with the spatial hash broadphase, and moving
+the rocks one at a time with the numpy BatchPhysicsGroup.
+
+With --check, every sprite left out by the broadphase is tested as well,
+and any that would have raised a Collision or Separation is counted.
+
+Usage:
+
+python -m benchmarks.physics [--rocks=1000] [--ticks=50] [--check]
+"""
+
+from argparse import ArgumentParser
+import os
+import random
+import time
+
+import pygame
+
+from zort.bootstrap import config
+from zort import resources
+from zort.entity import Rock
+from zort.environ.maze import new_maze
+from zort.hex_model import axial_to_sprites, collide_hex, sprites_to_axial
+from zort import physics
+from zort.physics import PhysicsGroup, BatchPhysicsGroup
+from zort.scenes import Scene
+
+
+class BruteForcePhysicsGroup(PhysicsGroup):
+    """PhysicsGroup that checks every sprite for collisions
+    """
+
+    def collision_candidates(self, sprite):
+        return self.sprites()
+
+
+class CheckedPhysicsGroup(PhysicsGroup):
+    """PhysicsGroup that counts sprites missed by the broadphase
+    """
+
+    def __init__(self, data):
+        super(CheckedPhysicsGroup, self).__init__(data)
+        self.missed = 0
+
+    def collision_candidates(self, sprite):
+        candidates = super(CheckedPhysicsGroup, self).collision_candidates(
+            sprite)
+        near = set(candidates)
+        axial = sprites_to_axial(sprite.position)
+        for other in self.sprites():
+            if other is sprite or other in near:
+                continue
+            if (sprite, other) in self.stale or \
+                    collide_hex(axial, sprites_to_axial(other.position),
+                                sprite.radius, other.radius):
+                self.missed += 1
+        return candidates
+
+
+class RecordingScene(Scene):
+    """Scene that keeps every collision event raised
+    """
+
+    def __init__(self):
+        super(RecordingScene, self).__init__('benchmark', None)
+        self.log = list()
+
+    def raise_contact(self, originator, event_name, left, right):
+        self.log.append((event_name, left, right))
+
+
+def init():
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    pygame.display.init()
+    pygame.mixer.init(frequency=config.getint('sound', 'frequency'),
+                      buffer=config.getint('sound', 'buffer'))
+    pygame.display.set_mode((1, 1))
+    for path, thing in resources.load():
+        pass
+
+
+def run(name, group_class, model, args):
+    random.seed(args.seed)
+    group = group_class(model)
+    for i in range(args.rocks):
+        rock = Rock('smallRockStone.png')
+        rock.bounce_sound.set_volume(0)
+        q = random.uniform(0, args.width)
+        r = random.uniform(0, args.height)
+        rock.position.x, rock.position.y = axial_to_sprites((q, r))
+        rock.position.z = random.uniform(0, 200)
+        rock.velocity.x = random.uniform(-.01, .01)
+        rock.velocity.y = random.uniform(-.01, .01)
+        rock.velocity.z = random.uniform(-.2, 0)
+        group.add(rock)
+
+    scene = RecordingScene()
+    start_time = time.time()
+    for tick in range(args.ticks):
+        group.tick(scene)
+        # keep the rocks bouncing
+        if tick % 50 == 49:
+            for rock in group.sprites():
+                rock.velocity.z = .3
+                rock.position.z = 1
+                group.wake_sprite(rock)
+    elapsed = (time.time() - start_time) * 1000.
+    print("%-8s %10.2f ms/tick %8d events" %
+          (name, elapsed / args.ticks, len(scene.log)))
+    return group
+
+
+def main(args):
+    init()
+    random.seed(args.seed)
+    model = new_maze(map_width=args.width, map_height=args.height)
+
+    print("%d rocks for %d ticks on %dx%d cells" %
+          (args.rocks, args.ticks, args.width, args.height))
+    run("hashed", PhysicsGroup, model, args)
+    if physics.numpy is not None:
+        run("batch", BatchPhysicsGroup, model, args)
+    if not args.skip_brute_force:
+        run("all", BruteForcePhysicsGroup, model, args)
+    if args.check:
+        group = run("checked", CheckedPhysicsGroup, model, args)
+        print("%d sprites missed by the broadphase" % group.missed)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        prog="benchmarks.physics",
+        description="Benchmark PhysicsGroup collision checks")
+
+    parser.add_argument(
+        "--rocks", required=False, default=1000, type=int,
+        help="Number of rocks to drop")
+
+    parser.add_argument(
+        "--ticks", required=False, default=50, type=int,
+        help="Number of physics ticks to run")
+
+    parser.add_argument(
+        "--width", required=False, default=40, type=int,
+        help="The width of the area in hex tiles")
+
+    parser.add_argument(
+        "--height", required=False, default=40, type=int,
+        help="The height of the area in hex tiles")
+
+    parser.add_argument(
+        "--skip-brute-force", required=False, action="store_true",
+        help="Only run the spatial hash")
+
+    parser.add_argument(
+        "--check", required=False, action="store_true",
+        help="Count sprites missed by the broadphase")
+
+    parser.add_argument(
+        "--seed", required=False, default=19, type=int,
+        help="Seed for the rocks")
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+
+"""
+Compares building a FastQuadTree from scratch every frame against moving
+items in a DynamicQuadTree, for many moving rects that are queried each
+frame, like sprites checked against the upper layer of the map.
+
+Usage:
+
+python -m benchmarks.quadtree [--items=2000] [--frames=100] [--moving=.1]
+"""
+
+from argparse import ArgumentParser
+import random
+import time
+
+from pygame import Rect
+
+from zort.quadtree import FastQuadTree, DynamicQuadTree
+
+
+class Box(object):
+    """moving rect, with the attributes FastQuadTree reads
+    """
+
+    def __init__(self, rect):
+        self.rect = rect
+        self.update()
+
+    def update(self):
+        self.left = self.rect.left
+        self.top = self.rect.top
+        self.right = self.rect.right
+        self.bottom = self.rect.bottom
+
+
+def new_boxes(args):
+    random.seed(args.seed)
+    boxes = list()
+    for i in range(args.items):
+        rect = Rect(random.randint(0, args.width),
+                    random.randint(0, args.height),
+                    random.randint(16, 64), random.randint(16, 64))
+        boxes.append(Box(rect))
+    return boxes
+
+
+def frames(boxes, args):
+    """yield the rects to query for each frame, after moving some boxes
+    """
+    random.seed(args.seed)
+    moving = int(len(boxes) * args.moving)
+    for frame in range(args.frames):
+        moved = random.sample(boxes, moving)
+        for box in moved:
+            box.rect.move_ip(random.randint(-8, 8), random.randint(-8, 8))
+            box.update()
+        queries = [Rect(random.randint(0, args.width),
+                        random.randint(0, args.height), 64, 64)
+                   for i in range(args.queries)]
+        yield moved, queries
+
+
+def run_rebuild(args):
+    boxes = new_boxes(args)
+    hits = 0
+    start_time = time.time()
+    for moved, queries in frames(boxes, args):
+        tree = FastQuadTree(boxes, 4)
+        for rect in queries:
+            hits += len(tree.hit(rect))
+    elapsed = (time.time() - start_time) * 1000.
+    print("%-8s %10.2f ms/frame %8d hits" %
+          ("rebuild", elapsed / args.frames, hits))
+
+
+def run_update(args):
+    boxes = new_boxes(args)
+    tree = DynamicQuadTree((0, 0, args.width, args.height))
+    for box in boxes:
+        tree.insert(box)
+
+    hits = 0
+    result = list()
+    start_time = time.time()
+    for moved, queries in frames(boxes, args):
+        for box in moved:
+            tree.move(box)
+        for rect in queries:
+            del result[:]
+            hits += len(tree.query(rect, result))
+    elapsed = (time.time() - start_time) * 1000.
+    print("%-8s %10.2f ms/frame %8d hits" %
+          ("update", elapsed / args.frames, hits))
+
+
+def main(args):
+    print("%d rects, %d moving, %d queries for %d frames" %
+          (args.items, int(args.items * args.moving), args.queries,
+           args.frames))
+    run_rebuild(args)
+    run_update(args)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        prog="benchmarks.quadtree",
+        description="Benchmark rebuilt and updated quadtrees")
+
+    parser.add_argument(
+        "--items", required=False, default=2000, type=int,
+        help="Number of rects in the tree")
+
+    parser.add_argument(
+        "--frames", required=False, default=100, type=int,
+        help="Number of frames to run")
+
+    parser.add_argument(
+        "--moving", required=False, default=.1, type=float,
+        help="Part of the rects moved each frame")
+
+    parser.add_argument(
+        "--queries", required=False, default=200, type=int,
+        help="Number of queries each frame")
+
+    parser.add_argument(
+        "--width", required=False, default=1200, type=int,
+        help="Width of the area in pixels")
+
+    parser.add_argument(
+        "--height", required=False, default=800, type=int,
+        help="Height of the area in pixels")
+
+    parser.add_argument(
+        "--seed", required=False, default=19, type=int,
+        help="Seed for the rects")
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+"""
+Draws many sprites with HexMapView, comparing the RectGrid used to find
+overlapping sprites against checking every sprite on the screen.
+
+Each frame some of the sprites are moved, and the view is cleared and
+drawn like the game loop does.
+
+Usage:
+
+python -m benchmarks.render [--sprites=2000] [--frames=100] [--moving=.1]
+"""
+
+from argparse import ArgumentParser
+import os
+import random
+import time
+
+import pygame
+
+from zort.bootstrap import config
+from zort import resources
+from zort.entity import Rock
+from zort.environ.maze import new_maze
+from zort.hex_model import axial_to_sprites
+from zort.hex_view import HexMapView, RectGrid
+
+
+class ScanRectGrid(RectGrid):
+    """RectGrid that checks every rect in a query
+    """
+
+    def query(self, rect, result):
+        for key, other in self.rects.items():
+            if rect.colliderect(other):
+                result.add(key)
+        return result
+
+
+def init():
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    pygame.display.init()
+    pygame.mixer.init(frequency=config.getint('sound', 'frequency'),
+                      buffer=config.getint('sound', 'buffer'))
+    screen = pygame.display.set_mode((config.getint('display', 'width'),
+                                      config.getint('display', 'height')))
+    for path, thing in resources.load():
+        pass
+    return screen
+
+
+def run(name, grid_class, model, screen, args):
+    random.seed(args.seed)
+    view = HexMapView(None, model, config.getint('display', 'hex_radius'))
+    view.sprite_grid = grid_class(view.sprite_grid_size)
+    rocks = list()
+    for i in range(args.sprites):
+        rock = Rock('smallRockStone.png')
+        q = random.uniform(0, args.width)
+        r = random.uniform(0, args.height)
+        rock.position.x, rock.position.y = axial_to_sprites((q, r))
+        rock.position.z = random.uniform(0, 50)
+        view.add(rock)
+        rocks.append(rock)
+
+    # first frame renders the terrain
+    view.draw(screen)
+
+    moving = int(len(rocks) * args.moving)
+    drawn = 0
+    start_time = time.time()
+    for frame in range(args.frames):
+        for rock in random.sample(rocks, moving):
+            rock.position.x += random.uniform(-.5, .5)
+            rock.position.y += random.uniform(-.5, .5)
+            rock.dirty = 1
+        drawn += sum(1 for rock in rocks if rock.dirty)
+        view.clear(screen)
+        view.draw(screen)
+    elapsed = (time.time() - start_time) * 1000.
+    print("%-8s %10.2f ms/frame %8d sprites drawn/frame" %
+          (name, elapsed / args.frames, drawn // args.frames))
+
+
+def main(args):
+    screen = init()
+    random.seed(args.seed)
+    model = new_maze(map_width=args.width, map_height=args.height)
+
+    print("%d sprites, %d moving, for %d frames on %dx%d cells" %
+          (args.sprites, int(args.sprites * args.moving), args.frames,
+           args.width, args.height))
+    run("grid", RectGrid, model, screen, args)
+    if not args.skip_scan:
+        run("all", ScanRectGrid, model, screen, args)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        prog="benchmarks.render",
+        description="Benchmark HexMapView sprite drawing")
+
+    parser.add_argument(
+        "--sprites", required=False, default=2000, type=int,
+        help="Number of sprites to draw")
+
+    parser.add_argument(
+        "--frames", required=False, default=100, type=int,
+        help="Number of frames to draw")
+
+    parser.add_argument(
+        "--moving", required=False, default=.1, type=float,
+        help="Part of the sprites moved each frame")
+
+    parser.add_argument(
+        "--width", required=False, default=20, type=int,
+        help="The width of the map in hex tiles")
+
+    parser.add_argument(
+        "--height", required=False, default=14, type=int,
+        help="The height of the map in hex tiles")
+
+    parser.add_argument(
+        "--skip-scan", required=False, action="store_true",
+        help="Only run the grid")
+
+    parser.add_argument(
+        "--seed", required=False, default=19, type=int,
+        help="Seed for the sprites")
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+"""
+Compares a Scheduler against timers that are sprites in a group, each
+counting the time that passed, like the old level Task.
+
+Most of the timers wait for a long time, so few of them fire each frame.
+
+Usage:
+
+python -m benchmarks.timers [--timers=5000] [--frames=1000]
+"""
+
+from argparse import ArgumentParser
+import random
+import time
+
+import pygame
+
+from zort.timers import Scheduler
+
+
+class SpriteTimer(pygame.sprite.Sprite):
+    """timer that is updated every frame, until it fires
+    """
+
+    def __init__(self, callback, interval):
+        super(SpriteTimer, self).__init__()
+        self.callback = callback
+        self.interval = interval
+        self._timer = 0
+
+    def update(self, delta):
+        self._timer += delta
+        if self._timer >= self.interval:
+            self.callback()
+            self.kill()
+
+
+def intervals(args):
+    random.seed(args.seed)
+    return [random.randint(16, args.frames * 160)
+            for i in range(args.timers)]
+
+
+def run_sprites(args):
+    fired = list()
+    group = pygame.sprite.Group()
+    for interval in intervals(args):
+        group.add(SpriteTimer(lambda: fired.append(1), interval))
+
+    start_time = time.time()
+    for frame in range(args.frames):
+        group.update(16)
+    elapsed = (time.time() - start_time) * 1000.
+    print("%-10s %10.3f ms/frame %8d fired" %
+          ("sprites", elapsed / args.frames, len(fired)))
+
+
+def run_scheduler(args):
+    fired = list()
+    scheduler = Scheduler()
+    for interval in intervals(args):
+        scheduler.schedule(lambda: fired.append(1), interval)
+
+    start_time = time.time()
+    for frame in range(args.frames):
+        scheduler.update(16)
+    elapsed = (time.time() - start_time) * 1000.
+    print("%-10s %10.3f ms/frame %8d fired" %
+          ("scheduler", elapsed / args.frames, len(fired)))
+
+
+def main(args):
+    print("%d timers for %d frames" % (args.timers, args.frames))
+    run_sprites(args)
+    run_scheduler(args)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        prog="benchmarks.timers",
+        description="Benchmark sprite timers against the Scheduler")
+
+    parser.add_argument(
+        "--timers", required=False, default=5000, type=int,
+        help="Number of waiting timers")
+
+    parser.add_argument(
+        "--frames", required=False, default=1000, type=int,
+        help="Number of frames to run")
+
+    parser.add_argument(
+        "--seed", required=False, default=19, type=int,
+        help="Seed for the intervals")
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,126 @@
+"""
+Seeking rules of enemies, run against a small open map.
+
+Resources are loaded with the dummy SDL drivers, so no window is opened.
+"""
+
+import os
+import unittest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+
+from zort import config
+from zort import resources
+from zort.enemies import Enemy
+from zort.euclid import Vector3
+from zort.hex_model import ArrayHexMapModel, Cell, axial_to_sprites
+from zort.pathfinding import PathScheduler
+
+
+def setUpModule():
+    path = os.path.join(os.path.dirname(__file__), '..', 'data', 'zort.ini')
+    config.read(path)
+    pygame.display.init()
+    pygame.mixer.init()
+    pygame.display.set_mode((1, 1))
+    for item in resources.load():
+        pass
+
+
+class Hero(object):
+    def __init__(self):
+        self.position = Vector3(0, 0, 0)
+
+
+class View(object):
+    def on_screen(self, sprite):
+        return True
+
+
+class Scene(object):
+    def __init__(self, model):
+        self.model = model
+        self.hero = Hero()
+        self.view = View()
+        self.pathfinding = PathScheduler(model, 5)
+        self.internal_event_group = list()
+
+
+def sprites_position(coords):
+    return Vector3(*(tuple(axial_to_sprites(coords)) + (0,)))
+
+
+class TestSeeking(unittest.TestCase):
+    def setUp(self):
+        model = ArrayHexMapModel()
+        model.add_cells([((q, r), Cell()) for q in range(30)
+                         for r in range(3)])
+        self.scene = Scene(model)
+        self.enemy = Enemy('alienGreen.png')
+        self.enemy.position = sprites_position((0, 1))
+        self.move_hero((25, 1))
+        # the first think sets the home of the enemy
+        self.enemy.update_ai(self.scene, None)
+        self.assertTrue(self.enemy.fsm.isstate('rambling'))
+        self.enemy.clear_path()
+
+    def move_hero(self, coords):
+        self.scene.hero.position = sprites_position(coords)
+
+    def test_path_reaches_hero(self):
+        self.move_hero((3, 1))
+        self.enemy.update_ai(self.scene, None)
+        self.assertTrue(self.enemy.fsm.isstate('seeking'))
+        self.assertEqual(self.enemy.path[0], (3, 1))
+        self.assertEqual(len(self.enemy.path), 3)
+        self.assertEqual(self.enemy.cells_followed, 0)
+
+    def test_cells_followed_kept_while_following_path(self):
+        self.move_hero((3, 1))
+        self.enemy.update_ai(self.scene, None)
+        self.enemy.path.pop()
+        self.enemy.cells_followed = 1
+        self.enemy.update_ai(self.scene, None)
+        self.assertEqual(self.enemy.cells_followed, 1)
+
+    def test_goes_home_when_hero_leaves_with_path_pending(self):
+        self.move_hero((3, 1))
+        self.enemy.update_ai(self.scene, None)
+        self.enemy.position = sprites_position((1, 1))
+        self.enemy.path.pop()
+        self.enemy.cells_followed = 1
+
+        self.move_hero((20, 1))
+        self.enemy.update_ai(self.scene, None)
+        self.assertTrue(self.enemy.fsm.isstate('going_home'))
+
+    def test_follows_hero_when_path_ran_out(self):
+        self.move_hero((3, 1))
+        self.enemy.update_ai(self.scene, None)
+        self.enemy.position = sprites_position((3, 1))
+        self.enemy.path = list()
+        self.enemy.cells_followed = 3
+
+        self.move_hero((10, 1))
+        self.enemy.update_ai(self.scene, None)
+        self.assertTrue(self.enemy.fsm.isstate('seeking'))
+        self.assertEqual(self.enemy.path[0], (10, 1))
+        self.assertEqual(self.enemy.cells_followed, 3)
+
+    def test_gives_up_after_follow_persistence(self):
+        self.move_hero((3, 1))
+        self.enemy.update_ai(self.scene, None)
+        self.enemy.position = sprites_position((2, 1))
+        self.enemy.path = list()
+        self.enemy.cells_followed = self.enemy.follow_persistence + 1
+
+        self.move_hero((20, 1))
+        self.enemy.update_ai(self.scene, None)
+        self.assertTrue(self.enemy.fsm.isstate('going_home'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+"""
+Sets of awake entities, so idle entities cost nothing each frame.
+
+The physics group, the entity group of a level and the view each keep
+the entities that are awake for them in an ActiveSet, and only look at
+those.  Entities are put to sleep by the owner of the set when they have
+nothing left to do, and are woken again by:
+
+  - GameEntity.wake, which is called when an entity is moved, stopped
+    or given input, and by the timers of the entity when they fire
+  - contact, when a moving entity collides with a sleeping one
+  - events addressed to the entity
+  - path searches the entity asked for, when they finish
+  - the level scene, which wakes enemies when the hero comes near them
+    or the map changes
+
+Each entity counts the sets it is awake in, in its 'awake' attribute,
+so it is False once every set let it sleep.
+"""
+
+from bisect import bisect_left, bisect_right
+
+__all__ = ['ActiveSet']
+
+
+class ActiveSet(object):
+    """awake members of a group, kept in the order of the group
+
+    Members are put in their place when they are woken, so the set is
+    looped over in order without sorting it each frame.
+
+    :param order: dict of member to a number giving its place, like the
+                  order members were added to the group in.  Without it,
+                  members are kept in the order they were woken.
+    """
+
+    def __init__(self, order=None):
+        self.order = order
+        self._count = 0
+        self._keys = list()
+        self._members = list()
+        # member: its key in _keys
+        self._woken = dict()
+
+    def __len__(self):
+        return len(self._members)
+
+    def __contains__(self, sprite):
+        return sprite in self._woken
+
+    def __iter__(self):
+        return iter(self._members)
+
+    def sprites(self):
+        """get a list of the awake members, safe to change while looping
+        """
+        return list(self._members)
+
+    def wake(self, sprite):
+        """:return: True if the sprite was asleep
+        """
+        if sprite in self._woken:
+            return False
+        if self.order is None:
+            self._count += 1
+            key = self._count
+        else:
+            key = self.order[sprite]
+        keys = self._keys
+        i = bisect_right(keys, key)
+        keys.insert(i, key)
+        self._members.insert(i, sprite)
+        self._woken[sprite] = key
+        sprite.awake = getattr(sprite, 'awake', 0) + 1
+        return True
+
+    def sleep(self, sprite):
+        """:return: True if the sprite was awake
+        """
+        try:
+            key = self._woken.pop(sprite)
+        except KeyError:
+            return False
+        keys = self._keys
+        i = bisect_left(keys, key)
+        while self._members[i] is not sprite:
+            i += 1
+        del keys[i]
+        del self._members[i]
+        sprite.awake -= 1
+        return True
+
+    def clear(self):
+        for sprite in self._members:
+            sprite.awake -= 1
+        del self._keys[:]
+        del self._members[:]
+        self._woken.clear()
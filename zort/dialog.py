@@ -9,6 +9,10 @@ __all__ = ['Dialog']
 
 
 class Dialog(GameEntity):
+    # the dialog gets its events from the scene
+    update_phases = ()
+    event_types = ()
+
     def __init__(self):
         super(Dialog, self).__init__('smallRockStone.png')
         self.border = gui.GraphicBox(resources.border_path, False)
@@ -20,24 +24,29 @@ class Dialog(GameEntity):
         self.needs_refresh = False
         self._listen = ['dialog-show', 'dialog-hidden', 'dialog-next']
 
-    def handle_internal_events(self, scene):
-        all_events = scene.state['events']
-        for event in all_events.get('dialog-show', list()):
-            self._dialog = resources.get_text(event['heading'])
-            text = next(self._dialog)
-            self.render_dialog(text)
+    def subscribe(self, events):
+        """listen to the dialog events of an EventBus
+        """
+        events.subscribe('dialog-show', self.on_show)
+        events.subscribe('dialog-hide', self.on_hide)
+        events.subscribe('dialog-next', self.on_next)
+
+    def on_show(self, scene, event):
+        self._dialog = resources.get_text(event['heading'])
+        text = next(self._dialog)
+        self.render_dialog(text)
 
-        for event in all_events.get('dialog-hide', list()):
-            scene.needs_refresh = True
-            self._dialog = None
-            self.surface = None
+    def on_hide(self, scene, event):
+        scene.needs_refresh = True
+        self._dialog = None
+        self.surface = None
 
-        for event in all_events.get('dialog-next', list()):
-            try:
-                text = next(self._dialog)
-                self.render_dialog(text)
-            except StopIteration:
-                scene.raise_event('dialog', 'dialog-hidden')
+    def on_next(self, scene, event):
+        try:
+            text = next(self._dialog)
+            self.render_dialog(text)
+        except StopIteration:
+            scene.raise_event('dialog', 'dialog-hidden')
 
     def render_dialog(self, text):
         if self.rect is None:
@@ -0,0 +1,89 @@
+"""
+Merging of the dirty rects drawn each frame, before the display is
+updated.
+
+Scenes return many small rects that overlap or touch, and the same rect
+is often in the list more than once.  Each rect passed to
+pygame.display.update costs a call, so rects are merged when that does
+not update more pixels, and the whole screen is flipped when most of it
+changed anyway.
+"""
+
+from pygame import Rect
+
+__all__ = ['DirtyRects']
+
+
+class DirtyRects(object):
+    """merges dirty rects and keeps statistics about the last frame
+
+    :param screen_rect: rect of the display surface
+    :param full_ratio: part of the screen that, once covered, makes the
+                       whole screen be updated instead
+    """
+
+    def __init__(self, screen_rect, full_ratio=.5):
+        self.screen_rect = Rect(screen_rect)
+        self.full_ratio = full_ratio
+
+        # statistics for the last frame
+        self.input_count = 0
+        self.rect_count = 0
+        self.covered = 0
+        self.full = False
+
+    def merge(self, rects):
+        """merge overlapping and touching rects of one frame
+
+        Two rects are merged if their union is no larger than both of
+        them added together.
+
+        :param rects: list of rects; empty rects and None are ignored
+        :return: list of rects to update; if .full is True, it holds only
+                 the screen rect
+        """
+        screen = self.screen_rect
+        limit = screen.w * screen.h * self.full_ratio
+        covered = 0
+        merged = list()
+        for rect in rects:
+            if not rect:
+                continue
+            rect = screen.clip(rect)
+            if not rect:
+                continue
+
+            area = rect.w * rect.h
+
+            # inflated by 1, rects with touching edges collide
+            while merged:
+                found = False
+                for i in rect.inflate(2, 2).collidelistall(merged):
+                    other = merged[i]
+                    union = rect.union(other)
+                    other_area = other.w * other.h
+                    if union.w * union.h <= area + other_area:
+                        merged[i] = merged[-1]
+                        merged.pop()
+                        covered -= other_area
+                        rect = union
+                        area = union.w * union.h
+                        found = True
+                        break
+                if not found:
+                    break
+            merged.append(rect)
+            covered += area
+
+            # no need to merge the rest once most of the screen is dirty
+            if covered >= limit:
+                break
+
+        self.input_count = len(rects)
+        self.full = covered >= limit
+        if self.full:
+            merged = [Rect(screen)]
+            covered = screen.w * screen.h
+        self.covered = covered
+        self.rect_count = len(merged)
+        return merged
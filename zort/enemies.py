@@ -5,7 +5,6 @@ from fysom import Fysom
 from zort.entity import GameEntity
 from zort.euclid import Vector2, Vector3
 from zort.hex_model import *
-from zort.level import Task
 from zort import resources
 
 
@@ -26,6 +25,11 @@ class Enemy(GameEntity):
     see the on_collide and on_separate methods
 
     """
+    # the ai is run from handle_internal_events every frame while awake
+    update_phases = ('update', 'think')
+    # cells past ramble_radius where the enemy stays awake, watching for
+    # the hero; the hero is checked again each time it changes cell
+    wake_margin = 2
 
     def __init__(self, filename):
         super(Enemy, self).__init__(filename)
@@ -37,6 +41,9 @@ class Enemy(GameEntity):
         self.follow_persistence = round(self.ramble_radius * 1.5)
         self.avoid_raised = True
         self.path = None
+        self.path_version = None
+        self.path_request = None
+        self._hero_far = False
         self.cell_snap = .01
         self.accel_speed = .000095
         self.max_accel = .000375
@@ -54,70 +61,138 @@ class Enemy(GameEntity):
                                'dst': 'seeking'}
                           ]})
 
+    def kill(self):
+        self.clear_path()
+        super(Enemy, self).kill()
+
     def handle_internal_events(self, scene):
         super(Enemy, self).handle_internal_events(scene)
         self.update_ai(scene, None)
 
     def update_ai(self, scene, event):
         fsm = self.fsm
+        model = scene.model
+
+        request = self.path_request
+        if request is not None and request.done():
+            self.path_request = None
+            if not request.cancelled():
+                self.path, self.path_version = request.result()
+
+        # cells may have been raised under the path since it was found
+        if not self.path_version == model.version:
+            if self.path:
+                self.path = model.repair_path(
+                    sprites_to_hex(self.position), self.path,
+                    self.path_version, self.avoid_raised)
+            if self.target_position is not None and self.avoid_raised:
+                if model.is_raised(sprites_to_hex(self.target_position)):
+                    self.target_position = None
+            self.path_version = model.version
 
         if fsm.isstate('home'):
             self.home_position = Vector3(*self.position)
             fsm.ramble()
-            self.path = None
+            self.clear_path()
 
         blacklist = set()
 
         hpos = scene.hero.position
-        pos = self.position
-        dist = abs(dist_axial(sprites_to_axial(pos), sprites_to_axial(hpos)))
-        if dist <= self.ramble_radius:
+        self._hero_far = not self.near(hpos, self.wake_margin)
+        if self.near(hpos):
             if not self.path:
-                pos = sprites_to_hex(pos)
-                next = sprites_to_hex(hpos)
-                self.path = scene.model.pathfind(
-                    pos, next, blacklist, self.avoid_raised)[0]
+                self.path = self.seek_path(scene)
                 self.cells_followed = 0
                 if not fsm.isstate('seeking'):
                     fsm.seek_player()
         elif fsm.isstate('seeking'):
             if self.cells_followed <= self.follow_persistence:
                 if not self.path:
-                    pos = sprites_to_hex(pos)
-                    next = sprites_to_hex(hpos)
-                    self.path = scene.model.pathfind(
-                        pos, next, blacklist, self.avoid_raised)[0]
+                    self.path = self.seek_path(scene)
                     return
                 else:
                     fsm.go_home()
-                    self.path = None
+                    self.clear_path()
             else:
                 fsm.go_home()
-                self.path = None
+                self.clear_path()
 
         if fsm.isstate('going_home'):
             if abs(self.position - self.home_position) >= self.cell_snap:
-                if not self.path:
+                if not self.path and self.path_request is None:
                     start = sprites_to_hex(self.position)
                     home = sprites_to_hex(self.home_position)
-                    self.path = scene.model.pathfind(
-                        start, home, blacklist, self.avoid_raised)[0]
+                    self.path_request = scene.pathfinding.submit(
+                        start, home, blacklist, self.avoid_raised,
+                        self.path_priority(scene))
+                    self.path_request.owner = self
                     return
             else:
                 fsm.ramble()
-                self.path = None
+                self.clear_path()
 
         if fsm.isstate('rambling'):
-            if not self.path:
+            if not self.path and self.path_request is None:
                 blacklist = {sprites_to_hex(sprite.position)
                              for sprite in scene.internal_event_group}
                 pos = sprites_to_hex(self.position)
                 home = sprites_to_hex(self.home_position)
-                self.path = scene.model.pathfind_ramble(
+                self.path_request = scene.pathfinding.submit_ramble(
                     pos, home, self.ramble_radius,
-                    blacklist, self.avoid_raised)[0]
+                    blacklist, self.avoid_raised,
+                    self.path_priority(scene))
+                self.path_request.owner = self
                 return
 
+    def near(self, position, margin=0):
+        """ True if position is within ramble_radius cells, plus margin
+        """
+        dist = dist_axial(sprites_to_axial(self.position),
+                          sprites_to_axial(position))
+        return abs(dist) <= self.ramble_radius + margin
+
+    def clear_path(self):
+        """ forget the path and any path search still waiting to run
+        """
+        self.path = None
+        if self.path_request is not None:
+            self.path_request.cancel()
+            self.path_request = None
+
+    def path_priority(self, scene):
+        """ priority of path searches; enemies on screen go first
+        """
+        if scene.view.on_screen(self):
+            return 0
+        return 1
+
+    def seek_path(self, scene):
+        """ get a path to the hero
+
+        seekers share one flow field toward the hero, so this follows the
+        field instead of searching.  the field only spreads as far as
+        seekers chase the hero
+        """
+        self.clear_path()
+        pos = sprites_to_hex(self.position)
+        hero = sprites_to_hex(scene.hero.position)
+        reach = self.ramble_radius + self.follow_persistence
+        return scene.model.seek_path(pos, hero, self.avoid_raised, reach)
+
+    @property
+    def idle(self):
+        """ True while stopped with nothing to walk to, and the hero out of
+        reach
+
+        the scene wakes the enemy when the map changes or the hero comes
+        near, see LevelScene.wake_thinkers, and a finished path request
+        wakes it too
+        """
+        if self.path or self.path_request is not None or \
+                self.target_position is not None or not self._hero_far:
+            return False
+        return super(Enemy, self).idle
+
     def update(self, delta):
         super(Enemy, self).update(delta)
 
@@ -188,8 +263,7 @@ class Saucer(Enemy):
         self.direction = Vector3(0, 0, 0)
         self._next = False
 
-        t = Task(self.shoot, random.randint(3000, 4000))
-        self.timers.add(t)
+        self.schedule(self.shoot, random.randint(3000, 4000))
 
     def update(self, delta):
         GameEntity.update(self, delta)
@@ -231,8 +305,7 @@ class Saucer(Enemy):
         return True
 
     def shoot(self):
-        t = Task(self.shoot, random.randint(3000, 6000))
-        self.timers.add(t)
+        self.schedule(self.shoot, random.randint(3000, 6000))
 
         self.laser_sound.set_volume(.4)
         self.laser_sound.play()
@@ -251,7 +324,5 @@ class Saucer(Enemy):
         laser.attach(self, (0, 0, -200))
         burst.attach(laser, (.4, 0, -200))
 
-        t = Task(laser.kill, 80)
-        self.timers.add(t)
-        t = Task(burst.kill, 115)
-        self.timers.add(t)
+        self.schedule(laser.kill, 80)
+        self.schedule(burst.kill, 115)
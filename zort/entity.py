@@ -1,38 +1,17 @@
 import pygame
-from pygame.transform import flip, smoothscale
 from zort.hex_model import *
+from zort import imagecache
 from zort import resources
 from zort.euclid import Vector2, Vector3
 from zort.physics import PhysicsGroup
+from zort.timers import Timer
 
 __all__ = ['GameEntity',
            'Button',
            'Door',
            'Rock',
            'CallbackEntity',
-           'ShipPart',
-           'filter_interested',
-           'filter_belong']
-
-
-def filter_interested(scene, interested):
-    retval = list()
-    for name in interested:
-        retval.extend(scene.state['events'].get(name, list()))
-    return retval
-
-
-def filter_belong(owner, events):
-    retval = list()
-    for event in events:
-        try:
-            members = [event['left'], event['right']]
-            members.remove(owner)
-            other = members[0]
-            retval.append((event, other))
-        except ValueError:
-            continue
-    return retval
+           'ShipPart']
 
 
 class GameEntity(pygame.sprite.DirtySprite):
@@ -45,11 +24,18 @@ class GameEntity(pygame.sprite.DirtySprite):
     see the on_collide and on_separate methods
 
     """
+    # phases of the level scene the entity is updated in, see EntityGroup
+    update_phases = ('update',)
+    # events addressed to the entity that handle_internal_events handles
+    event_types = ('Collision', 'Separation')
 
     def __init__(self, filename):
         super(GameEntity, self).__init__()
         self.gravity = True
-        self.timers = pygame.sprite.Group()
+        self.scheduler = None
+        self._timers = list()
+        # number of activity sets the entity is awake in, see zort.activity
+        self.awake = 0
         self.position = Vector3(-100, -100, 0)
         self.acceleration = Vector3(0, 0, 0)
         self.velocity = Vector3(0, 0, 0)
@@ -84,12 +70,44 @@ class GameEntity(pygame.sprite.DirtySprite):
         self._attached = None
         if self.carried is not None:
             self.drop()
+        for timer in self._timers:
+            timer.cancel()
+        del self._timers[:]
         super(GameEntity, self).kill()
 
+    def schedule(self, callback, interval=0, loops=1, args=None,
+                 kwargs=None):
+        """ run callback later, using the timers of the scene
+
+        timers of an entity that is not in a scene yet are started when
+        it is added to one, and are cancelled when the entity is killed
+
+        :return: Timer
+        """
+        timer = Timer(callback, interval, loops, args, kwargs)
+        timer.owner = self
+        self._timers = [i for i in self._timers
+                        if i.active or i.deadline is None]
+        self._timers.append(timer)
+        if self.scheduler is not None:
+            self.scheduler.add(timer)
+        return timer
+
+    def set_scheduler(self, scheduler):
+        """ set the timers of the scene, and start the waiting timers
+        """
+        self.scheduler = scheduler
+        for timer in self._timers:
+            if timer.deadline is None:
+                scheduler.add(timer)
+
     def stop(self):
-        self.velocity = Vector3(0, 0, 0)
-        self.acceleration = Vector3(0, 0, 0)
-        self.wake()
+        v = self.velocity
+        a = self.acceleration
+        if v.x or v.y or v.z or a.x or a.y or a.z:
+            self.velocity = Vector3(0, 0, 0)
+            self.acceleration = Vector3(0, 0, 0)
+            self.wake()
 
     def pickup(self):
         if not self._pickup_cooldown:
@@ -141,21 +159,32 @@ class GameEntity(pygame.sprite.DirtySprite):
                 return g
 
     def wake(self):
-        try:
-            self.physics_group.wake_sprite(self)
-        except AttributeError:
-            pass
+        """ wake the entity in every group that lets idle sprites sleep
+        """
+        for group in self.groups():
+            try:
+                group.wake_sprite(self)
+            except AttributeError:
+                pass
+
+    @property
+    def idle(self):
+        """ True if updating the entity would do nothing until it is woken
+        """
+        if self._pickup_cooldown or self._playing_move_sound or \
+                self._attached is not None:
+            return False
+        v = self.velocity
+        a = self.acceleration
+        return not (v.x or v.y or v.z or a.x or a.y or a.z or
+                    (self.gravity and self.position.z))
 
     def update_image(self):
-        w, h = self.original_image.get_size()
-        self.image = smoothscale(flip(self.original_image, self._flipped, 0),
-                                 (int(w * self.scale), int(h * self.scale)))
+        self.image = imagecache.get_transformed(self.original_image,
+                                                self._flipped, self.scale)
         self.anchor = self.original_anchor * self.scale
-        self.image = self.image.convert_alpha()
 
     def update(self, delta):
-        self.timers.update(delta)
-
         if self._pickup_cooldown:
             self._pickup_cooldown -= delta
             if self._pickup_cooldown < 0:
@@ -177,6 +206,7 @@ class GameEntity(pygame.sprite.DirtySprite):
             self.dirty = 1
             entity, anchor = self._attached
             self.position = entity.position + anchor
+            self.wake()
 
     @property
     def grounded(self):
@@ -198,13 +228,14 @@ class GameEntity(pygame.sprite.DirtySprite):
                 group.needs_refresh = True
 
     def handle_internal_events(self, scene):
-        events = filter_belong(self, filter_interested(scene, ('Collision',)))
-        for event, other in events:
+        events = scene.events
+        for event in events.addressed(self, 'Collision'):
+            other = event.other(self)
             self.on_collide(scene, other)
             self._collided.add(other)
 
-        events = filter_belong(self, filter_interested(scene, ('Separation',)))
-        for event, other in events:
+        for event in events.addressed(self, 'Separation'):
+            other = event.other(self)
             self.on_separate(scene, other)
             try:
                 self._collided.remove(other)
@@ -249,35 +280,37 @@ class Rock(GameEntity):
 
 
 class Door(GameEntity):
-    def __init__(self, filename, key, cell):
+    # doors get their Switch events from the scene
+    update_phases = ()
+    event_types = ()
+
+    def __init__(self, filename, key, cell, coords=None):
         super(Door, self).__init__(filename)
         assert (key is not None and cell is not None)
         self.key = key
         self.cell = cell
+        self.coords = coords
         self.visible = False
 
-    def handle_internal_events(self, scene):
-        interested = scene.state['events'].get('Switch', None)
-        if not interested:
+    def on_switch(self, scene, event):
+        """subscribed to the 'Switch' events of the scene
+        """
+        if not event['key'] == self.key:
             return
 
-        for event in interested:
-            if not event['key'] == self.key:
-                continue
-
-            cell = self.cell
-            if event['state']:
-                if not cell.height == 3:
-                    cell.filename = 'tileMagic_full.png'
-                    cell.height = 3
-                    cell.raised = True
-                    self.trigger_view_refresh()
-            else:
-                if cell.raised:
-                    cell.filename = 'tileGrass_full.png'
-                    cell.height = 0
-                    cell.raised = False
-                    self.trigger_view_refresh()
+        cell = self.cell
+        if event['state']:
+            if not cell.height == 3:
+                cell.filename = 'tileMagic_full.png'
+                cell.height = 3
+                cell.raised = True
+                scene.model.cell_changed(self.coords)
+        else:
+            if cell.raised:
+                cell.filename = 'tileGrass_full.png'
+                cell.height = 0
+                cell.raised = False
+                scene.model.cell_changed(self.coords)
 
 
 class CallbackEntity(GameEntity):
@@ -77,8 +77,9 @@ def new_maze(map_width=10,
              tile_height=1.0,
              raised_tile='tileRock_full.png',
              lowered_tile='tileGrass.png',
-             num_adjacent=1):
-    model = HexMapModel()
+             num_adjacent=1,
+             model_class=HexMapModel):
+    model = model_class()
     for q, r in itertools.product(range(map_width), range(map_height)):
         coords = evenr_to_axial((q, r))
         cell = Cell()
@@ -0,0 +1,286 @@
+"""
+Events raised by entities and scenes, for the other entities of a scene.
+
+An event lives for two frames, so it is seen by every entity no matter
+if it was updated before or after the event was raised.  Events are kept
+in a ring of frames; when a frame is reused, the events raised in it are
+dropped all at once.
+
+Events are found in three ways, and none of them looks at events that
+were not asked for:
+
+  - get(event_name) returns the live events of one type
+  - addressed(owner, event_name) returns the events where owner is the
+    'left' or 'right' participant, like Collision and Separation, and
+    participants(event_name) returns the owners that have some
+  - callbacks passed to subscribe(event_name, callback) are called once
+    for every event of that type, when dispatch is called
+
+Event records are pooled.  When a frame is reused, its records are put
+back in the pool and handed out again, so a scene that raises about the
+same number of events each frame does not make new ones.  Because of
+this, events must not be kept after the frame they were looked up in.
+"""
+
+__all__ = ['Event', 'EventBus']
+
+
+class Event(object):
+    """record of one event
+
+    Values are read like a dict: event['left'], event['key'].  Values
+    other than the originator and the participants are kept in a dict,
+    which is None for events that have none, like Collision.
+    """
+    __slots__ = ('name', 'originator', 'left', 'right', 'values', 'frame')
+    fields = ('name', 'originator', 'left', 'right')
+
+    def __init__(self):
+        self.name = None
+        self.originator = None
+        self.left = None
+        self.right = None
+        self.values = None
+        self.frame = 0
+
+    def __repr__(self):
+        return "<Event %s %s>" % (self.name, self.values)
+
+    def __getitem__(self, key):
+        if key in self.fields:
+            return getattr(self, key)
+        if self.values is None:
+            raise KeyError(key)
+        return self.values[key]
+
+    def __contains__(self, key):
+        if key in self.fields:
+            return True
+        return self.values is not None and key in self.values
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def other(self, owner):
+        """get the participant that is not owner
+        """
+        if self.left is owner:
+            return self.right
+        return self.left
+
+
+class EventBus(object):
+    """typed events, indexed by type and by participant
+
+    :param lifetime: number of frames an event is kept for
+    """
+
+    def __init__(self, lifetime=2):
+        self.lifetime = lifetime
+        self.frame = 0
+        self._index = 0
+        # for each frame: {event_name: [event, ...]}
+        self._types = [dict() for i in range(lifetime)]
+        # for each frame: {event_name: {participant: [event, ...]}}
+        self._addressed = [dict() for i in range(lifetime)]
+        # events not yet given to subscribers
+        self._pending = list()
+        # {event_name: (callback, ...)}
+        self._subscribers = dict()
+        self._pool = list()
+
+        # number of event records made, for checking the pool
+        self.allocations = 0
+        self.total_allocations = 0
+
+    @property
+    def pool_size(self):
+        return len(self._pool)
+
+    def _frames(self):
+        """indexes of the frames, oldest first
+        """
+        lifetime = self.lifetime
+        index = self._index
+        return [(index + i + 1) % lifetime for i in range(lifetime)]
+
+    def _new_event(self, originator, event_name, left, right, values):
+        try:
+            event = self._pool.pop()
+        except IndexError:
+            event = Event()
+            self.allocations += 1
+            self.total_allocations += 1
+
+        event.name = event_name
+        event.originator = originator
+        event.left = left
+        event.right = right
+        event.values = values
+        event.frame = self.frame
+
+        index = self._index
+        types = self._types[index]
+        try:
+            types[event_name].append(event)
+        except KeyError:
+            types[event_name] = [event]
+
+        if left is not right:
+            addressed = self._addressed[index]
+            try:
+                owners = addressed[event_name]
+            except KeyError:
+                owners = addressed[event_name] = dict()
+            for owner in (left, right):
+                if owner is None:
+                    continue
+                try:
+                    owners[owner].append(event)
+                except KeyError:
+                    owners[owner] = [event]
+
+        self._pending.append(event)
+        return event
+
+    def raise_event(self, originator, event_name, **kwargs):
+        """add an event to the current frame
+
+        :param originator: object or name that raised the event
+        :param event_name: type of the event
+        :param kwargs: values of the event; 'left' and 'right' are the
+                       participants it is addressed to
+        :return: the event
+        """
+        left = kwargs.pop('left', None)
+        right = kwargs.pop('right', None)
+        return self._new_event(originator, event_name, left, right,
+                               kwargs or None)
+
+    def raise_contact(self, originator, event_name, left, right):
+        """add an event between two participants, without other values
+
+        Used for Collision and Separation, which are raised often.
+        """
+        return self._new_event(originator, event_name, left, right, None)
+
+    def get(self, event_name):
+        """get the live events of a type, oldest first
+
+        :return: list of events
+        """
+        result = list()
+        types = self._types
+        for index in self._frames():
+            events = types[index].get(event_name, None)
+            if events:
+                result.extend(events)
+        return result
+
+    def addressed(self, owner, event_name):
+        """get the live events of a type that owner takes part in
+
+        The other participant of each is event.other(owner).
+
+        :return: list of events
+        """
+        result = list()
+        addressed = self._addressed
+        for index in self._frames():
+            owners = addressed[index].get(event_name, None)
+            if owners:
+                events = owners.get(owner, None)
+                if events:
+                    result.extend(events)
+        return result
+
+    def participants(self, event_name):
+        """get the participants of the live events of a type
+
+        A participant of events in both frames is in the list twice.
+
+        :return: list of participants
+        """
+        result = list()
+        addressed = self._addressed
+        for index in self._frames():
+            owners = addressed[index].get(event_name, None)
+            if owners:
+                result.extend(owners)
+        return result
+
+    def subscribe(self, event_name, callback):
+        """call callback(scene, event) for each new event of a type
+
+        Callbacks are called from dispatch.
+        """
+        callbacks = self._subscribers.get(event_name, ())
+        if callback not in callbacks:
+            self._subscribers[event_name] = callbacks + (callback,)
+
+    def unsubscribe(self, event_name, callback):
+        callbacks = self._subscribers.get(event_name, ())
+        callbacks = tuple(i for i in callbacks if not i == callback)
+        if callbacks:
+            self._subscribers[event_name] = callbacks
+        else:
+            self._subscribers.pop(event_name, None)
+
+    def dispatch(self, scene):
+        """give the events raised since the last dispatch to subscribers
+
+        Events raised by the callbacks are given out before returning.
+        """
+        pending = self._pending
+        subscribers = self._subscribers
+        i = 0
+        while i < len(pending):
+            event = pending[i]
+            i += 1
+            for callback in subscribers.get(event.name, ()):
+                callback(scene, event)
+        del pending[:]
+
+    def advance(self):
+        """start a new frame, putting the events of the oldest in the pool
+        """
+        self.frame += 1
+        self.allocations = 0
+        self._index = index = (self._index + 1) % self.lifetime
+        self._recycle(index)
+
+        # events that were never dispatched are about to be reused
+        pending = self._pending
+        if pending and pending[0].frame <= self.frame - self.lifetime:
+            oldest = self.frame - self.lifetime
+            i = 0
+            while i < len(pending) and pending[i].frame <= oldest:
+                i += 1
+            del pending[:i]
+
+    def _recycle(self, index):
+        pool = self._pool
+        for events in self._types[index].values():
+            for event in events:
+                event.originator = event.left = event.right = None
+                event.values = None
+            pool.extend(events)
+            del events[:]
+        for owners in self._addressed[index].values():
+            owners.clear()
+
+    def clear(self):
+        """drop every event and subscriber
+
+        The events are not put in the pool, as they may still be looked
+        at by the entities that were being updated.
+        """
+        for index in range(self.lifetime):
+            for events in self._types[index].values():
+                del events[:]
+            self._addressed[index].clear()
+        del self._pending[:]
+        self._subscribers.clear()
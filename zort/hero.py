@@ -15,6 +15,7 @@ class Hero(GameEntity):
     see the on_collide and on_separate methods
 
     """
+    update_phases = ('update', 'input')
 
     def __init__(self, filename):
         super(Hero, self).__init__(filename)
@@ -29,10 +30,11 @@ class Hero(GameEntity):
         grounded = self.position.z == self.velocity.z == 0
         moving = self.velocity.x or self.velocity.y or self.velocity.z
 
-        self.wake()
         if not grounded:
             return
 
+        before = self.acceleration.x, self.acceleration.y
+
         if pressed[K_DOWN]:
             self.acceleration.y = self.movement_accel
             moved = True
@@ -58,5 +60,5 @@ class Hero(GameEntity):
                 if e.key == K_SPACE:
                     self.pickup()
 
-        if moved:
+        if moved or not before == (self.acceleration.x, self.acceleration.y):
             self.wake()
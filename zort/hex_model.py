@@ -1,3 +1,6 @@
+from array import array
+from collections import deque
+from functools import partial
 from heapq import heappush, heappop
 from math import sqrt
 import random
@@ -5,12 +8,16 @@ import json
 import codecs
 import time
 from zort.environ import util
+from zort.pathfinding import PathFinder, FlowField
+from zort.hierarchy import ClusterGraph
 
 
 # even-r : 'pointy top'
 
 __all__ = ['HexMapModel',
+           'ArrayHexMapModel',
            'Cell',
+           'CellView',
            'evenr_to_axial',
            'axial_to_evenr',
            'pixel_to_axial',
@@ -182,6 +189,12 @@ class HexMapModel(object):
         self._height = None
         self._dirty = False
 
+        # incremented by cell_changed, so caches can tell they are stale
+        self.version = 0
+
+        # coords passed to the most recent calls of cell_changed
+        self._changes = deque(maxlen=64)
+
     def surrounding(self, coords, avoid_raised=True):
         s = (coords for coords in util.surrounding_noclip(coords)
              if coords in self._data)
@@ -205,12 +218,7 @@ class HexMapModel(object):
 
         for n in neighbors:
             neigh = tuple([int(i) for i in n])
-            cell = self._data.get(neigh, None)
-
-            if cell is None:
-                continue
-
-            if not cell.raised:
+            if not self.is_raised(neigh):
                 continue
 
             new = coords[0] - wall_offset[0], coords[1] - wall_offset[1]
@@ -218,12 +226,18 @@ class HexMapModel(object):
                 retval.append(neigh)
         return retval
 
+    def is_raised(self, coords):
+        """test if the cell at axial coords exists and is raised
+        """
+        cell = self._data.get(coords, None)
+        return cell is not None and cell.raised
+
     def _make_file_data(self):
         return {
             "width": self._width,
             "height": self._height,
             "data": {str(key): value.to_json() for key, value in
-                     self._data.items()}
+                     self.cells}
         }
 
     def save_to_disk(self, path):
@@ -234,11 +248,11 @@ class HexMapModel(object):
     def load_from_disk(self, path):
         with codecs.open(path, "rb", encoding="utf-8") as fob:
             data = json.load(fob)
+            self.clear()
+            self.add_cells((eval(key), Cell(**cell_data))
+                           for key, cell_data in data["data"].items())
             self._width = data["width"]
             self._height = data["height"]
-            self._data = dict()
-            for key, cell_data in data["data"].items():
-                self._data[eval(key)] = Cell(**cell_data)
 
     def get_cell(self, coords):
         return self._data.get(tuple(coords), None)
@@ -254,10 +268,79 @@ class HexMapModel(object):
         self._data[coords] = cell
         self._trigger_bounds_update()
 
+    def add_cells(self, cells):
+        """add many (coords, cell) pairs at once
+        """
+        for coords, cell in cells:
+            self.add_cell(coords, cell)
+
+    def clear(self):
+        self._data = dict()
+        self._trigger_bounds_update()
+
     def remove_cell(self, coords):
         del self._data[coords]
         self._trigger_bounds_update()
 
+    def cell_changed(self, coords=None):
+        """call after changing the raised, height or cost of a cell
+
+        :param coords: axial coords of the cell, or None if not known
+        """
+        self.version += 1
+        self._changes.append(coords)
+
+    def changed_since(self, version):
+        """get coords of cells changed since a version
+
+        :return: list of coords, or None if the changes are not known
+        """
+        count = self.version - version
+        if count > len(self._changes):
+            return None
+        changes = list(self._changes)[len(self._changes) - count:]
+        if None in changes:
+            return None
+        return changes
+
+    def repair_path(self, current, path, version, avoid_raised=True):
+        """fix a path from pathfind after cells were raised
+
+        Only the part of the path between the raised cells is searched
+        again, and the rest of the path is kept.
+
+        :param current: axial coords of the cell the path is followed from
+        :param path: path returned by pathfind, goal first
+        :param version: map version the path was found at
+        :return: repaired path, or None if it must be found again
+        """
+        if not avoid_raised or not path:
+            return path
+
+        changed = self.changed_since(version)
+        if changed is not None:
+            changed = set(changed)
+            if not any(coords in changed for coords in path):
+                return path
+
+        blocked = [i for i, coords in enumerate(path)
+                   if self.is_raised(coords)]
+        if not blocked:
+            return path
+
+        # the path is goal first, so first is the blocked cell nearest
+        # the goal and last is the one nearest to current
+        first, last = blocked[0], blocked[-1]
+        if first == 0:
+            return None
+
+        end = path[first - 1]
+        start = path[last + 1] if last + 1 < len(path) else current
+        detour, complete = self.pathfind(start, end, set(), avoid_raised)
+        if not detour or not complete:
+            return None
+        return path[:first - 1] + detour + path[last + 1:]
+
     def _trigger_bounds_update(self):
         self._width = None
         self._height = None
@@ -341,11 +424,24 @@ class HexMapModel(object):
                                             avoid_raised)
 
         blacklist.update(
-            {coord for coord in self._data})
+            {coord for coord, cell in self.cells})
         blacklist.difference_update(neighbors)
         return self.pathfind(current, random.choice(list(neighbors)), blacklist,
                              avoid_raised)
 
+    def next_step(self, current, end, avoid_raised=True, reach=None):
+        """get the next cell to move to on the way to end, or None
+        """
+        path = self.seek_path(current, end, avoid_raised, reach)
+        return path[-1] if path else None
+
+    def seek_path(self, current, end, avoid_raised=True, reach=None):
+        """get a path to end for something chasing it, goal first, or None
+
+        :param reach: how far from end the chaser looks; unused here
+        """
+        return self.pathfind(current, end, set(), avoid_raised)[0]
+
     def pathfind(self, current, end, blacklist=set(), avoid_raised=True):
         def cell_available(cell):
             return coord_available(cell[1])
@@ -353,12 +449,13 @@ class HexMapModel(object):
         def coord_available(coord):
             return coord not in closed_set and coord not in blacklist
 
+        # path is goal first, so path.pop() returns the next step
         def retrace_path(c):
             path = []
             while parent.get(c, None) is not None:
-                c = parent[c]
                 path.append(c)
-            return list(reversed(path)) or None
+                c = parent[c]
+            return path or None
 
         start_time = time.time()
         parent = {}
@@ -395,3 +492,506 @@ class HexMapModel(object):
                     heappush(open_heap, cell[1])
 
         return None, True
+
+
+class CellView(object):
+    """Cell stand-in that reads and writes the columns of an ArrayHexMapModel
+
+    Views are cached by the model, so the same cell always returns the
+    same view and identity tests (`cell is hovered`) keep working.
+    """
+
+    __slots__ = ['model', 'index']
+
+    def __init__(self, model, index):
+        self.model = model
+        self.index = index
+
+    @property
+    def cost(self):
+        return self.model.cost_col[self.index]
+
+    @cost.setter
+    def cost(self, value):
+        self.model.cost_col[self.index] = int(value)
+
+    @property
+    def filename(self):
+        return self.model.filename_of(self.model.tile_col[self.index])
+
+    @filename.setter
+    def filename(self, value):
+        self.model.tile_col[self.index] = self.model.tile_id(value)
+
+    @property
+    def raised(self):
+        return bool(self.model.raised_col[self.index])
+
+    @raised.setter
+    def raised(self, value):
+        self.model.raised_col[self.index] = bool(value)
+
+    @property
+    def height(self):
+        return self.model.height_col[self.index]
+
+    @height.setter
+    def height(self, value):
+        self.model.height_col[self.index] = float(value)
+
+    def to_json(self):
+        return {
+            "cost": self.cost,
+            "filename": self.filename,
+            "raised": self.raised,
+            "height": self.height
+        }
+
+
+class ArrayHexMapModel(HexMapModel):
+    """HexMapModel that keeps cells in dense typed columns
+
+    Cells are addressed by a linear index computed from even-r offset
+    coordinates: index = row * stride + column.  Lookups do not hash
+    tuples, and the columns can be scanned directly by pathfinding and
+    collision code.  get_cell and cells return CellView objects, so code
+    written for Cell objects works unchanged.
+    """
+
+    # searches at least this far use the cluster graph, None to disable
+    hierarchy_distance = 24
+    hierarchy_cluster_size = 10
+
+    def __init__(self):
+        super(ArrayHexMapModel, self).__init__()
+        self._data = None
+        self._col0 = 0
+        self._row0 = 0
+        self.stride = 0
+        self.rows = 0
+        self.present_col = array('b')
+        self.cost_col = array('i')
+        self.raised_col = array('b')
+        self.height_col = array('d')
+        self.tile_col = array('h')
+        self._views = list()
+        self._filenames = list()
+        self._tile_ids = dict()
+        self._pathfinder = None
+        self._flow_fields = dict()
+        self._hierarchies = dict()
+
+    def snapshot(self):
+        """get the walkable grid of the map as plain values for pickling
+
+        :return: (layout, present bytes, raised bytes, cost bytes)
+        """
+        layout = self._col0, self._row0, self.stride, self.rows
+        return (layout, self.present_col.tobytes(),
+                self.raised_col.tobytes(), self.cost_col.tobytes())
+
+    def load_snapshot(self, snapshot):
+        """replace the walkable grid with one from snapshot
+
+        Tiles and heights are not part of a snapshot.  The pathfinder is
+        kept if the cells are laid out the same way.
+        """
+        layout, present, raised, cost = snapshot
+        same_layout = layout == (self._col0, self._row0,
+                                 self.stride, self.rows) and \
+            present == self.present_col.tobytes()
+        if not same_layout:
+            self.clear()
+            self._col0, self._row0, self.stride, self.rows = layout
+            size = self.stride * self.rows
+            self.present_col.frombytes(present)
+            self.height_col = array('d', [0.0]) * size
+            self.tile_col = array('h', [-1]) * size
+            self._views = [None] * size
+
+        self.raised_col = array('b')
+        self.raised_col.frombytes(raised)
+        self.cost_col = array('i')
+        self.cost_col.frombytes(cost)
+        self.cell_changed()
+
+    def tile_id(self, filename):
+        if filename is None:
+            return -1
+        try:
+            return self._tile_ids[filename]
+        except KeyError:
+            tile = len(self._filenames)
+            self._filenames.append(filename)
+            self._tile_ids[filename] = tile
+            return tile
+
+    def filename_of(self, tile):
+        return None if tile < 0 else self._filenames[tile]
+
+    def index_of(self, coords):
+        """get linear index for axial coords, or None if there is no cell
+
+        :param coords: axial coords
+        :return: int or None
+        """
+        q, r = int(coords[0]), int(coords[1])
+        col = q + ((r + (r & 1)) >> 1) - self._col0
+        row = r - self._row0
+        if 0 <= col < self.stride and 0 <= row < self.rows:
+            index = row * self.stride + col
+            if self.present_col[index]:
+                return index
+        return None
+
+    def coords_of(self, index):
+        """get axial coords for a linear index
+        """
+        row, col = divmod(index, self.stride)
+        r = row + self._row0
+        return col + self._col0 - ((r + (r & 1)) >> 1), r
+
+    def indexes(self):
+        present = self.present_col
+        return [i for i in range(len(present)) if present[i]]
+
+    def _view(self, index):
+        view = self._views[index]
+        if view is None:
+            view = CellView(self, index)
+            self._views[index] = view
+        return view
+
+    def _reserve(self, col0, row0, col1, row1):
+        """grow the columns to hold offset coords in [col0, col1) x [row0, row1)
+        """
+        if self.stride:
+            col0 = min(col0, self._col0)
+            row0 = min(row0, self._row0)
+            col1 = max(col1, self._col0 + self.stride)
+            row1 = max(row1, self._row0 + self.rows)
+            if (col0, row0) == (self._col0, self._row0) and \
+                    (col1 - col0, row1 - row0) == (self.stride, self.rows):
+                return
+
+        stride = col1 - col0
+        rows = row1 - row0
+        size = stride * rows
+        present = array('b', [0]) * size
+        cost = array('i', [0]) * size
+        raised = array('b', [0]) * size
+        height = array('d', [0.0]) * size
+        tile = array('h', [-1]) * size
+        views = [None] * size
+
+        old_stride = self.stride
+        for old_row in range(self.rows):
+            src = old_row * old_stride
+            dst = (old_row + self._row0 - row0) * stride + self._col0 - col0
+            end = src + old_stride
+            present[dst:dst + old_stride] = self.present_col[src:end]
+            cost[dst:dst + old_stride] = self.cost_col[src:end]
+            raised[dst:dst + old_stride] = self.raised_col[src:end]
+            height[dst:dst + old_stride] = self.height_col[src:end]
+            tile[dst:dst + old_stride] = self.tile_col[src:end]
+            for offset, view in enumerate(self._views[src:end]):
+                if view is not None:
+                    view.index = dst + offset
+                    views[dst + offset] = view
+
+        self._col0 = col0
+        self._row0 = row0
+        self.stride = stride
+        self.rows = rows
+        self.present_col = present
+        self.cost_col = cost
+        self.raised_col = raised
+        self.height_col = height
+        self.tile_col = tile
+        self._views = views
+
+    def _grow_to(self, col, row):
+        if not self.stride:
+            self._reserve(col, row, col + 1, row + 1)
+            return
+
+        # grow by at least half again, so filling a map cell by cell
+        # does not copy the columns for every new row or column
+        col0, row0 = self._col0, self._row0
+        col1, row1 = col0 + self.stride, row0 + self.rows
+        pad_c = max(1, self.stride // 2)
+        pad_r = max(1, self.rows // 2)
+        if col < col0:
+            col0 = min(col, col0 - pad_c)
+        elif col >= col1:
+            col1 = max(col + 1, col1 + pad_c)
+        if row < row0:
+            row0 = min(row, row0 - pad_r)
+        elif row >= row1:
+            row1 = max(row + 1, row1 + pad_r)
+        self._reserve(col0, row0, col1, row1)
+
+    def _store(self, coords, cell):
+        q, r = [int(i) for i in coords]
+        col = q + ((r + (r & 1)) >> 1)
+        if not (0 <= col - self._col0 < self.stride and
+                0 <= r - self._row0 < self.rows):
+            self._grow_to(col, r)
+        index = (r - self._row0) * self.stride + col - self._col0
+        self.present_col[index] = 1
+        self.cost_col[index] = int(cell.cost)
+        self.raised_col[index] = bool(cell.raised)
+        self.height_col[index] = float(cell.height)
+        self.tile_col[index] = self.tile_id(cell.filename)
+
+    def add_cell(self, coords, cell):
+        coords = tuple(coords)
+        assert (len(coords) == 2)
+        self._store(coords, cell)
+        self._trigger_bounds_update()
+
+    def add_cells(self, cells):
+        cells = [(tuple(int(i) for i in coords), cell)
+                 for coords, cell in cells]
+        if cells:
+            cols = [q + ((r + (r & 1)) >> 1) for (q, r), cell in cells]
+            rows = [r for (q, r), cell in cells]
+            self._reserve(min(cols), min(rows), max(cols) + 1, max(rows) + 1)
+        for coords, cell in cells:
+            self._store(coords, cell)
+        self._trigger_bounds_update()
+
+    def clear(self):
+        self._col0 = 0
+        self._row0 = 0
+        self.stride = 0
+        self.rows = 0
+        self.present_col = array('b')
+        self.cost_col = array('i')
+        self.raised_col = array('b')
+        self.height_col = array('d')
+        self.tile_col = array('h')
+        self._views = list()
+        self._trigger_bounds_update()
+
+    def remove_cell(self, coords):
+        index = self.index_of(coords)
+        if index is None:
+            raise KeyError(coords)
+        self.present_col[index] = 0
+        self._views[index] = None
+        self._trigger_bounds_update()
+
+    def get_cell(self, coords):
+        index = self.index_of(coords)
+        if index is None:
+            return None
+        return self._view(index)
+
+    def is_raised(self, coords):
+        index = self.index_of(coords)
+        return index is not None and bool(self.raised_col[index])
+
+    def surrounding(self, coords, avoid_raised=True):
+        index_of = self.index_of
+        raised = self.raised_col
+        retval = list()
+        for n in util.surrounding_noclip(coords):
+            index = index_of(n)
+            if index is None:
+                continue
+            if avoid_raised and raised[index]:
+                continue
+            retval.append(n)
+        return retval
+
+    def _trigger_bounds_update(self):
+        super(ArrayHexMapModel, self)._trigger_bounds_update()
+        self._pathfinder = None
+        self._flow_fields = dict()
+        self._hierarchies = dict()
+
+    def _calc_bounds(self):
+        indexes = self.indexes()
+        if not indexes:
+            self._width = 0
+            self._height = 0
+            return
+
+        stride = self.stride
+        cols = [i % stride for i in indexes]
+        self._width = max(cols) - min(cols) + 1
+        self._height = indexes[-1] // stride - indexes[0] // stride + 1
+
+    @property
+    def cells(self):
+        coords_of = self.coords_of
+        view = self._view
+        return [(coords_of(i), view(i)) for i in self.indexes()]
+
+    @property
+    def pathfinder(self):
+        if self._pathfinder is None:
+            self._pathfinder = PathFinder(self)
+        return self._pathfinder
+
+    def _blocked_indexes(self, blacklist):
+        index_of = self.index_of
+        return {index_of(coords) for coords in blacklist} - {None}
+
+    def path_coords(self, path):
+        """convert a path of indexes from the PathFinder to axial coords
+        """
+        if not path:
+            return None
+        coords_of = self.coords_of
+        return [coords_of(index) for index in path]
+
+    def pathfind_args(self, current, end, blacklist=set(), avoid_raised=True):
+        """get PathFinder.search arguments for a pathfind call
+
+        :return: tuple of arguments, or None if there can be no path
+        """
+        start = self.index_of(current)
+        goal = self.index_of(end)
+        if start is None or goal is None:
+            return None
+
+        blocked = self._blocked_indexes(blacklist)
+        if goal in blocked or (avoid_raised and self.raised_col[goal]):
+            return None
+
+        distance = self.hierarchy_distance
+        if distance is not None and not blocked and \
+                self.pathfinder.distance(start, goal) >= distance:
+            return partial(self._search_hierarchy, start, goal, avoid_raised)
+        return start, goal, blocked, avoid_raised, None
+
+    def hierarchy(self, avoid_raised=True):
+        """get the ClusterGraph used for long searches
+        """
+        graph = self._hierarchies.get(avoid_raised, None)
+        if graph is None:
+            graph = ClusterGraph(self.pathfinder,
+                                 self.hierarchy_cluster_size, avoid_raised)
+            self._hierarchies[avoid_raised] = graph
+        return graph
+
+    def _search_hierarchy(self, start, goal, avoid_raised):
+        path = self.hierarchy(avoid_raised).search(start, goal)
+        return self.path_coords(path), True
+
+    def ramble_args(self, current, home, radius, blacklist=set(),
+                    avoid_raised=True):
+        """get PathFinder.search arguments for a pathfind_ramble call
+
+        :return: tuple of arguments, or None if there can be no path
+        """
+        start = self.index_of(current)
+        center = self.index_of(home)
+        if start is None or center is None:
+            return None
+
+        blocked = self._blocked_indexes(blacklist)
+        region = self.pathfinder.within_radius(center, radius, avoid_raised)
+        region.difference_update(blocked)
+        if not region:
+            return None
+
+        goal = random.choice(list(region))
+        return start, goal, blocked, avoid_raised, region
+
+    def _search(self, args):
+        if args is None:
+            return None, True
+        if callable(args):
+            return args()
+        return self.path_coords(self.pathfinder.search(*args)), True
+
+    def pathfind_ramble(self, current, home, radius, blacklist=set(),
+                        avoid_raised=True):
+        return self._search(self.ramble_args(
+            current, home, radius, blacklist, avoid_raised))
+
+    def pathfind(self, current, end, blacklist=set(), avoid_raised=True):
+        return self._search(self.pathfind_args(
+            current, end, blacklist, avoid_raised))
+
+    def cell_changed(self, coords=None):
+        super(ArrayHexMapModel, self).cell_changed(coords)
+        index = None if coords is None else self.index_of(coords)
+        if index is None:
+            self._hierarchies = dict()
+            return
+
+        for graph in self._hierarchies.values():
+            graph.cell_changed(index)
+
+        # repair fields that were current, the rest rebuild when used
+        for field in self._flow_fields.values():
+            if field.version == self.version - 1:
+                field.update_cell(index)
+                field.version = self.version
+
+    def flow_field(self, end, avoid_raised=True, reach=None):
+        """get a FlowField toward end, built once per goal and map version
+
+        The field is built out to the largest reach asked for since it was
+        last built, so it only spreads as far as its followers need.
+
+        :param end: axial coords of the goal
+        :param reach: cost from end the field must cover, or None for the
+                      whole map
+        :return: FlowField or None if end is not in the map
+        """
+        goal = self.index_of(end)
+        if goal is None:
+            return None
+
+        field = self._flow_fields.get(avoid_raised, None)
+        if field is None:
+            field = FlowField(self.pathfinder)
+            self._flow_fields[avoid_raised] = field
+
+        if reach is None:
+            field.wanted = None
+        elif field.wanted is not None:
+            field.wanted = max(field.wanted, reach)
+
+        if not (field.goal == goal and field.version == self.version and
+                field.reaches(reach)):
+            field.build(goal, avoid_raised, self.version, field.wanted)
+            field.wanted = reach
+        return field
+
+    def _seek(self, current, end, avoid_raised, reach):
+        """get a path of indexes toward end, goal first, or None
+
+        Cells outside of the flow field are searched from, expanding up
+        to the cells within twice the reach.
+        """
+        start = self.index_of(current)
+        field = self.flow_field(end, avoid_raised, reach)
+        if start is None or field is None:
+            return None
+
+        if field.covers(start) or field.limit is None:
+            return field.path(start)
+
+        radius = 2 * reach
+        return self.pathfinder.search(start, field.goal,
+                                      avoid_raised=avoid_raised,
+                                      limit=3 * radius * (radius + 1) + 1)
+
+    def next_step(self, current, end, avoid_raised=True, reach=None):
+        path = self._seek(current, end, avoid_raised, reach)
+        return self.coords_of(path[-1]) if path else None
+
+    def seek_path(self, current, end, avoid_raised=True, reach=None):
+        """get a path to end by following the flow field toward it
+
+        :param reach: see flow_field
+        :return: list of axial coords, goal first, or None
+        """
+        return self.path_coords(self._seek(current, end, avoid_raised,
+                                           reach))
@@ -3,15 +3,22 @@ from itertools import product
 
 import pygame
 import pygame.gfxdraw
-from pygame.transform import smoothscale
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
-from zort.euclid import Vector2, Vector3
+from zort.activity import ActiveSet
+from zort.euclid import Vector2
+from zort import config
 from zort import resources
+from zort.dirtyrects import DirtyRects
 from zort.hex_model import *
 from zort import quadtree
+from zort import tileatlas
 
 
-__all__ = ['HexMapView']
+__all__ = ['HexMapView', 'Camera', 'RectGrid']
 
 
 class UpperLayerRect():
@@ -25,7 +32,153 @@ class UpperLayerRect():
         self.bottom = rect.bottom
 
 
+class TerrainChunk(object):
+    """cached tile blits for a block of rows of the map
+
+    blits are (image, position, rect) in draw order, and columns are
+    (draw order, blits) for the raised tiles of each tall cell.  Until
+    the chunk is needed, blits is None and rect is an estimate.
+    """
+
+    def __init__(self, rows, rect):
+        self.rows = rows
+        self.rect = rect
+        self.blits = None
+        self.columns = list()
+
+
+class RectGrid(object):
+    """uniform grid of screen rects, for finding overlapping sprites
+
+    Each rect is kept in every grid cell it touches, so a query only
+    looks at rects near it.  Cells are only changed when a rect moves
+    into other grid cells.
+
+    :param cell_size: width and height of a grid cell, in pixels
+    """
+
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.buckets = dict()
+        self.rects = dict()
+        self._span = dict()
+
+    def __len__(self):
+        return len(self.rects)
+
+    def __contains__(self, key):
+        return key in self.rects
+
+    def _cells(self, rect):
+        size = self.cell_size
+        return (rect.left // size, rect.top // size,
+                (rect.right - 1) // size, (rect.bottom - 1) // size)
+
+    def set(self, key, rect):
+        """add or move the rect of a key; an empty rect removes it
+        """
+        if not rect:
+            self.remove(key)
+            return
+
+        span = self._cells(rect)
+        old = self._span.get(key, None)
+        self.rects[key] = rect
+        if span == old:
+            return
+
+        if old is not None:
+            self._discard(key, old)
+        self._span[key] = span
+        buckets = self.buckets
+        left, top, right, bottom = span
+        for cell in product(range(left, right + 1), range(top, bottom + 1)):
+            try:
+                buckets[cell].add(key)
+            except KeyError:
+                buckets[cell] = {key}
+
+    def remove(self, key):
+        span = self._span.pop(key, None)
+        if span is not None:
+            del self.rects[key]
+            self._discard(key, span)
+
+    def _discard(self, key, span):
+        buckets = self.buckets
+        left, top, right, bottom = span
+        for cell in product(range(left, right + 1), range(top, bottom + 1)):
+            bucket = buckets[cell]
+            bucket.discard(key)
+            if not bucket:
+                del buckets[cell]
+
+    def query(self, rect, result):
+        """add the keys of rects that overlap rect to a set
+        """
+        buckets = self.buckets
+        rects = self.rects
+        left, top, right, bottom = self._cells(rect)
+        for cell in product(range(left, right + 1), range(top, bottom + 1)):
+            bucket = buckets.get(cell, None)
+            if bucket:
+                for key in bucket:
+                    if key not in result and rect.colliderect(rects[key]):
+                        result.add(key)
+        return result
+
+
+class Camera(object):
+    """scroll position of a HexMapView
+
+    x and y are how far, in pixels, the view is scrolled from the map
+    centered in the window.  If a target is followed, it is kept in the
+    middle of the view as far as the edges of the map allow.  Maps that
+    fit in the window do not scroll.
+    """
+
+    def __init__(self):
+        self.x = 0
+        self.y = 0
+        self.target = None
+
+    def follow(self, sprite):
+        self.target = sprite
+
+    def scroll(self, dx, dy):
+        self.target = None
+        self.x += dx
+        self.y += dy
+
+    def update(self, view):
+        w, h = view.rect.size
+        if self.target is not None:
+            x, y = view.project(sprites_to_axial(self.target.position))
+            self.x = int(x - w / 2)
+            self.y = int(y - h / 2)
+
+        bounds = view.map_rect
+        if bounds.width <= w:
+            self.x = 0
+        else:
+            self.x = min(max(self.x, bounds.left), bounds.right - w)
+
+        if bounds.height <= h:
+            self.y = 0
+        else:
+            self.y = min(max(self.y, bounds.top), bounds.bottom - h)
+
+
 class HexMapView(pygame.sprite.LayeredUpdates):
+    # rows of cells in each cached chunk of terrain
+    chunk_rows = 4
+
+    # pixels of terrain kept around the window, so scrolling is a blit
+    scroll_margin = 256
+
+    # size of the cells used to find overlapping sprites, in pixels
+    sprite_grid_size = 64
+
     border_color = 61, 55, 42, 64
     line_color = 61, 42, 42
     fill_color = 161, 92, 120
@@ -40,6 +193,9 @@ class HexMapView(pygame.sprite.LayeredUpdates):
         self.tilt = .84
         self.size_ratio = 1.3
 
+        # folder scaled tiles are saved to
+        self.atlas_path = config.get('paths', 'tile-cache')
+
         self.default_cell = Cell()
         self.default_cell.filename = 'tileGrass.png'
 
@@ -53,9 +209,15 @@ class HexMapView(pygame.sprite.LayeredUpdates):
         self.rect = None
         self.lostsprites = list()
         self.map_rect = None
-        self._old_hovered = None
+        # highlighted cells, by axial coords
         self._hovered = None
-        self._selected = list()
+        self._selected = set()
+        self._highlights_changed = False
+
+        # highlights stamped in the map buffer, {coords: color}
+        self._highlights = dict()
+        self._highlight_grid = RectGrid()
+        self._stamps = dict()
         self._hex_draw = None
         self._hex_tile = None
         self.project = None
@@ -63,8 +225,49 @@ class HexMapView(pygame.sprite.LayeredUpdates):
         self.voff = None
         self.pixel_offset = None
         self.layer_quadtree = None
+
+        # terrain cache, rebuilt when None
+        self._chunks = None
+        self._cell_tiles = None
+        self._upper = None
+        self._version = None
+
+        # part of the map the map buffer holds, in map pixels
+        self.buffer_rect = None
+        self._buffer_offset = 0, 0
+
+        self.camera = Camera()
+        self._camera_position = None
+
+        # terms of the projection, for projecting many sprites at once
+        self._projection = None
+
+        # (size of the map, positions of every cell), or None
+        self._cell_positions = None
+
+        # sprite => ((x, y, z, anchor x, anchor y), top left corner)
+        self._sprite_points = dict()
+
+        # screen rects of drawn sprites, mirroring spritedict
+        self.sprite_grid = RectGrid(self.sprite_grid_size)
+
+        # rects of sprites in map pixels, where they were last drawn or
+        # culled, for finding the sprites a scrolled view shows
+        self.map_grid = RectGrid(self.sprite_grid_size)
+
+        # sprites the view made dirty, or that were added
+        self.awake = ActiveSet()
+
+        # other sets of sprites that may have been made dirty since the
+        # last draw, like sprites moved by physics.  if None, every sprite
+        # is checked each draw
+        self.activity = None
+        self._draw_order = dict()
+        self._added = 0
+
+        # callable returning the position to draw a sprite at
+        self.interpolate = None
         self.set_radius(radius)
-        self.spritedict["hover"] = None
 
         self.background = resources.images['backdrop']
 
@@ -97,20 +300,20 @@ class HexMapView(pygame.sprite.LayeredUpdates):
             tile = tile_dict[cell.filename]
             return blit(tile, (int(x), int(y)))
 
-        tile_dict = dict()
         ph = self.hex_radius * 2
         pw = (sqrt(3) / 2 * ph)
         ph *= self.tilt
         half_width = int(pw / 2.)
         half_height = int(ph / 2.)
-        pw += 1
 
-        for filename, image in resources.tiles.items():
-            if filename.startswith('tile'):
-                iw, ih = image.get_size()
-                height = pw * (float(ih) / iw)
-                image = smoothscale(image, (int(pw), int(height)))
-                tile_dict[filename] = image
+        # tiles are scaled once per size, and only when a map uses them
+        tile_dict = tileatlas.get_atlas(self.hex_radius, self.tilt,
+                                        self.size_ratio, self.atlas_path)
+        filenames = set(cell.filename for coords, cell in self.data.cells)
+        filenames.add(self.default_cell.filename)
+        filenames.discard(None)
+        if tile_dict.require(filenames):
+            tile_dict.save()
 
         return draw_tile
 
@@ -120,8 +323,6 @@ class HexMapView(pygame.sprite.LayeredUpdates):
             coords += screen_offset
             return coords
 
-        # cache of the expensive axial => cart transform
-        cache = dict()
         size_sqrt3 = self.hex_radius * sqrt(3)
         size_ratio = self.hex_radius * 3. / 2.
 
@@ -147,40 +348,488 @@ class HexMapView(pygame.sprite.LayeredUpdates):
 
         self.map_rect = map_rect
         self.pixel_offset = screen_offset
+        self._projection = size_sqrt3, size_ratio, screen_offset
+
+        # positions from the old projection are no longer good
+        self._cell_positions = None
+        self._sprite_points.clear()
+
+        return project
+
+    def cell_positions(self):
+        """get the position of every cell of the map, before scrolling
+
+        The table is made once for each projection and size of the map,
+        and gives the same positions as project().
+
+        :return: list of (x, y), in the order cells are drawn
+        """
+        size = self.data.size
+        try:
+            table_size, table = self._cell_positions
+            if table_size == size:
+                return table
+        except TypeError:
+            pass
+
+        ww, hh = size
+        size_sqrt3, size_ratio, offset = self._projection
+        ox, oy = offset.x, offset.y
+        if numpy is not None:
+            rr, qq = numpy.divmod(numpy.arange(ww * hh), ww)
+            q = qq - (rr + (rr & 1)) / 2.
+            x = size_sqrt3 * (q + rr / 2.) + ox
+            y = size_ratio * rr + oy
+            table = list(zip(x.tolist(), y.tolist()))
+        else:
+            table = list()
+            for rr in range(hh):
+                for qq in range(ww):
+                    q, r = evenr_to_axial((qq, rr))
+                    table.append((size_sqrt3 * (q + r / 2.) + ox,
+                                  size_ratio * r + oy))
+
+        self._cell_positions = size, table
+        return table
+
+    def cell_blits(self, coords, cell, position=None):
+        """get the tiles drawn for a cell, in draw order
+
+        :param position: position of the cell from cell_positions(), or
+                         None to project the coords
+
+        :return: (terrain, column) lists of (image, position, rect); the
+                 column holds the raised tiles that can cover sprites
+        """
+        blits = list()
+
+        def record(image, position):
+            rect = pygame.Rect(position, image.get_size())
+            blits.append((image, position, rect))
+            return rect
+
+        draw_tile = self._hex_tile
+        if position is None:
+            position = self.project(coords, cell)
+        pos = Vector2(*position)
+        if cell.height > 0:
+            draw_tile(record, self.default_cell, pos)
+            for i in range(int(ceil(cell.height))):
+                pos.y -= self.voff / 2
+                draw_tile(record, cell, pos)
+            return blits, blits[1:]
+
+        draw_tile(record, cell, pos)
+        return blits, list()
+
+    def render_terrain(self):
+        """drop the terrain cache and render the part around the view
+        """
+        ww, hh = self.data.size
+        positions = self.cell_positions()
+
+        # columns of tall cells reach up into the rows above them
+        heights = [cell.height for coords, cell in self.data.cells]
+        overhang = self.voff / 2 * int(ceil(max(heights + [0])))
+        margin = self.hex_radius * 3
+
+        self._cell_tiles = dict()
+        self._chunks = list()
+        rows = self.chunk_rows
+        for first in range(0, hh, rows):
+            last = min(first + rows, hh) - 1
+            corners = [positions[i] for i in
+                       (first * ww, first * ww + ww - 1,
+                        last * ww, last * ww + ww - 1)]
+            left = min(i[0] for i in corners) - margin
+            top = min(i[1] for i in corners) - margin - overhang
+            right = max(i[0] for i in corners) + margin
+            bottom = max(i[1] for i in corners) + margin
+            rect = pygame.Rect(left, top, right - left, bottom - top)
+            self._chunks.append(TerrainChunk(range(first, last + 1), rect))
+
+        bounds = self._chunks[0].rect.unionall(
+            [chunk.rect for chunk in self._chunks[1:]])
+        self.layer_quadtree = quadtree.DynamicQuadTree(bounds)
+        self._upper = dict()
+
+        # highlights move when the size of a hex changes
+        grid = self._highlight_grid
+        for coords, color in self._highlights.items():
+            grid.set(coords, self._highlight_rect(coords, color))
+
+        self.buffer_rect = None
+        self._move_buffer(self._viewport())
+
+    def render_cells(self, changes):
+        """render only the chunks and upper layer touched by changed cells
+
+        :param changes: axial coords of the changed cells
+        :return: list of rects of the map that changed, in map pixels
+        """
+        get_cell = self.data.get_cell
+        positions = self.cell_positions()
+        ww, hh = self.data.size
+        damaged = list()
+        columns = list()
+        chunks = set()
+        for coords in set(changes):
+            qq, rr = [int(i) for i in axial_to_evenr(coords)]
+            if not (0 <= qq < ww and 0 <= rr < hh):
+                continue
+
+            order = rr * ww + qq
+            chunk = self._chunks[rr // self.chunk_rows]
+            terrain, column = self.cell_blits(coords, get_cell(coords),
+                                              positions[order])
+            rects = [i[2] for i in terrain]
+
+            # chunks not rendered yet only need room for the new tiles
+            if chunk.blits is None:
+                chunk.rect.union_ip(rects[0].unionall(rects[1:]))
+                continue
+
+            old_terrain, old_column = self._cell_tiles[order]
+            self._cell_tiles[order] = terrain, column
+            chunks.add(chunk)
+
+            rects.extend(i[2] for i in old_terrain)
+            damaged.append(rects[0].unionall(rects[1:]))
+            rects = [i[2] for i in old_column + column]
+            if rects:
+                columns.append((order, rects[0].unionall(rects[1:])))
+
+        for chunk in chunks:
+            self._build_chunk(chunk, True)
+
+        damaged = [rect for rect in damaged
+                   if rect.colliderect(self.buffer_rect)]
+        for rect in damaged:
+            self._repaint(rect)
+
+        # the upper layer of a tall cell has every column drawn before it
+        upper = self._upper
+        window = self.buffer_rect
+        affected = set()
+        for changed, rect in columns:
+            affected.add(changed)
+            affected.update(order for order, up in upper.items()
+                            if order > changed and rect.colliderect(up.rect))
+
+        tree = self.layer_quadtree
+        for order in affected:
+            old = upper.pop(order, None)
+            if old is not None:
+                tree.remove(old)
+
+            column = self._cell_tiles[order][1]
+            if column and column[0][2].colliderect(window):
+                up = self._upper_rect(order)
+                upper[order] = up
+                tree.insert(up)
+
+        return damaged
+
+    def _viewport(self):
+        """get the part of the map shown in the window, in map pixels
+        """
+        return pygame.Rect((self.camera.x, self.camera.y), self.rect.size)
+
+    def _move_buffer(self, viewport):
+        """center the map buffer on the viewport, keeping what it can
+
+        Pixels still inside the buffer are scrolled, and only the strips
+        that were not in the buffer before are rendered.
+        """
+        margin = self.scroll_margin
+        old = self.buffer_rect
+        new = viewport.inflate(margin * 2, margin * 2)
+        self.buffer_rect = new
+
+        kept = None if old is None else old.clip(new)
+        if kept:
+            self.map_buffer.scroll(old.x - new.x, old.y - new.y)
+            if new.top < kept.top:
+                self._repaint(pygame.Rect(new.left, new.top,
+                                          new.width, kept.top - new.top))
+            if kept.bottom < new.bottom:
+                self._repaint(pygame.Rect(new.left, kept.bottom, new.width,
+                                          new.bottom - kept.bottom))
+            if new.left < kept.left:
+                self._repaint(pygame.Rect(new.left, kept.top,
+                                          kept.left - new.left, kept.height))
+            if kept.right < new.right:
+                self._repaint(pygame.Rect(kept.right, kept.top,
+                                          new.right - kept.right, kept.height))
+        else:
+            self._repaint(new)
 
-        def cached_project(i, cell=None, use_cache=False):
-            if use_cache:
+        # upper layers are only kept for tall cells near the view
+        old_upper = self._upper
+        tree = self.layer_quadtree
+        upper = dict()
+        for chunk in self._chunks:
+            if not chunk.rect.colliderect(new):
+                continue
+            self._build_chunk(chunk)
+            for order, column in chunk.columns:
+                if column[0][2].colliderect(new):
+                    try:
+                        upper[order] = old_upper.pop(order)
+                    except KeyError:
+                        up = self._upper_rect(order)
+                        upper[order] = up
+                        tree.insert(up)
+        for up in old_upper.values():
+            tree.remove(up)
+        self._upper = upper
+
+    def _build_chunk(self, chunk, force=False):
+        """get the blits of every cell of a chunk, if not done yet
+        """
+        if chunk.blits is not None and not force:
+            return
+
+        get_cell = self.data.get_cell
+        positions = self.cell_positions()
+        ww = self.data.size[0]
+        cell_tiles = self._cell_tiles
+        blits = list()
+        columns = list()
+        for rr in chunk.rows:
+            for qq in range(ww):
+                order = rr * ww + qq
                 try:
-                    return cache[i]
+                    terrain, column = cell_tiles[order]
                 except KeyError:
-                    coords = project(i, cell)
-                    cache[i] = coords
-                    return coords
-            else:
-                return project(i, cell)
+                    pos = evenr_to_axial((qq, rr))
+                    terrain, column = self.cell_blits(pos, get_cell(pos),
+                                                      positions[order])
+                    cell_tiles[order] = terrain, column
+                blits.extend(terrain)
+                if column:
+                    columns.append((order, column))
+
+        chunk.blits = blits
+        chunk.columns = columns
+        if blits:
+            chunk.rect = blits[0][2].unionall([i[2] for i in blits[1:]])
+        else:
+            chunk.rect = pygame.Rect(0, 0, 0, 0)
+
+    def _repaint(self, rect):
+        """draw the background and terrain inside rect of the map buffer
+
+        :param rect: area in map pixels
+        """
+        rect = rect.clip(self.buffer_rect)
+        if not rect:
+            return
+
+        _buffer = self.map_buffer
+        blit = _buffer.blit
+        ox, oy = self.buffer_rect.topleft
+        _buffer.set_clip(rect.move(-ox, -oy))
+
+        # the backdrop is tiled over the map
+        bw, bh = self.background.get_size()
+        for y in range(rect.top // bh, (rect.bottom - 1) // bh + 1):
+            for x in range(rect.left // bw, (rect.right - 1) // bw + 1):
+                blit(self.background, (x * bw - ox, y * bh - oy))
+
+        for chunk in self._chunks:
+            if chunk.rect.colliderect(rect):
+                self._build_chunk(chunk)
+                for image, position, tile_rect in chunk.blits:
+                    if tile_rect.colliderect(rect):
+                        blit(image, (position[0] - ox, position[1] - oy))
+
+        # highlights are drawn over the terrain, a row at a time
+        if self._highlights:
+            rects = self._highlight_grid.rects
+            found = self._highlight_grid.query(rect, set())
+            for coords in sorted(found, key=lambda i: (rects[i].top,
+                                                       rects[i].left)):
+                stamp, center = self.get_hex_stamp(self._highlights[coords])
+                blit(stamp, rects[coords].move(-ox, -oy))
+        _buffer.set_clip(None)
+
+    def get_hex_stamp(self, fill_color):
+        """get a hex outline filled with a color, drawn once for each color
+
+        :return: (surface, center of the hex on the surface)
+        """
+        try:
+            return self._stamps[fill_color]
+        except KeyError:
+            pass
+
+        w = int(ceil(self.hex_radius * sqrt(3))) + 4
+        h = int(ceil(self.hex_radius * 2 * self.tilt)) + 4
+        surface = pygame.Surface((w, h), pygame.SRCALPHA)
+        center = w // 2, h // 2
+        self._hex_draw(surface, center, self.border_color, fill_color)
+        stamp = surface, center
+        self._stamps[fill_color] = stamp
+        return stamp
+
+    def _highlight_rect(self, coords, fill_color):
+        """get the rect of the highlight of a cell, in map pixels
+        """
+        stamp, center = self.get_hex_stamp(fill_color)
+        x, y = self.project(coords)
+        rect = stamp.get_rect()
+        rect.topleft = int(round(x)) - center[0], int(round(y)) - center[1]
+        return rect
+
+    def _update_highlights(self):
+        """stamp the changed highlights into the map buffer
 
-        return cached_project
+        :return: list of rects of the map that changed, in map pixels
+        """
+        self._highlights_changed = False
+        wanted = dict((coords, self.select_color)
+                      for coords in self._selected)
+        if self._hovered is not None and self._hovered not in wanted:
+            wanted[self._hovered] = self.hover_color
+
+        drawn = self._highlights
+        grid = self._highlight_grid
+        changed = list()
+        for coords, color in drawn.items():
+            if not wanted.get(coords, None) == color:
+                changed.append(grid.rects[coords])
+                grid.remove(coords)
+        for coords, color in wanted.items():
+            if not drawn.get(coords, None) == color:
+                rect = self._highlight_rect(coords, color)
+                grid.set(coords, rect)
+                changed.append(rect)
+        self._highlights = wanted
+
+        # neighboring highlights overlap, so they are painted together
+        damaged = DirtyRects(self.buffer_rect, 1).merge(changed)
+        for rect in damaged:
+            self._repaint(rect)
+        return damaged
+
+    def _upper_rect(self, order):
+        """draw the upper layer for a tall cell from the cached columns
+        """
+        image, position, rect = self._cell_tiles[order][1][0]
+        surf = pygame.Surface(rect.size, pygame.SRCALPHA)
+        blit = surf.blit
+        x, y = rect.topleft
+        for chunk in self._chunks:
+            if not chunk.rect.colliderect(rect):
+                continue
+            self._build_chunk(chunk)
+            for other, column in chunk.columns:
+                if other > order:
+                    break
+                for image, position, tile_rect in column:
+                    if tile_rect.colliderect(rect):
+                        blit(image, (position[0] - x, position[1] - y))
+        return UpperLayerRect(surf, rect, 1)
 
     def set_radius(self, radius):
         self.hex_radius = radius
         self.overlap_limit = int(radius * .25)
         self.needs_cache = True
 
-    def select_cell(self, cell):
-        self._selected.append(cell)
+    def _cell_coords(self, cell, coords=None):
+        """get the axial coords of a cell, finding them if not given
+        """
+        if coords is None:
+            for coords, other in self.data.cells:
+                if other is cell:
+                    break
+            else:
+                return None
+        return int(coords[0]), int(coords[1])
+
+    def select_cell(self, cell, coords=None):
+        coords = self._cell_coords(cell, coords)
+        if coords is not None and coords not in self._selected:
+            self._selected.add(coords)
+            self._highlights_changed = True
+
+    def deselect_cell(self, cell, coords=None):
+        coords = self._cell_coords(cell, coords)
+        if coords in self._selected:
+            self._selected.remove(coords)
+            self._highlights_changed = True
+
+    def clear_selection(self):
+        if self._selected:
+            self._selected.clear()
+            self._highlights_changed = True
+
+    def highlight_cell(self, cell, coords=None):
+        """highlight the cell under the cursor; None removes the highlight
+        """
+        if cell is not None:
+            coords = self._cell_coords(cell, coords)
+        else:
+            coords = None
+        if not coords == self._hovered:
+            self._hovered = coords
+            self._highlights_changed = True
+
+    def on_screen(self, sprite):
+        """ True if the sprite was drawn inside the view last frame
+        """
+        rect = self.spritedict.get(sprite, None)
+        if not rect or self.rect is None:
+            return False
+        return self.rect.colliderect(rect)
+
+    def project_sprites(self, sprites):
+        """get the top left corner of many sprites, before scrolling
 
-    def highlight_cell(self, cell):
-        if self._old_hovered is not cell:
-            self._old_hovered = self._hovered
-            self._hovered = cell
+        This gives the same result as project() for each sprite, without
+        making a vector for every one.
+
+        :return: list of (x, y), one for each sprite
+        """
+        size_sqrt3, size_ratio, offset = self._projection
+        ox, oy = offset.x, offset.y
+        interpolate = self.interpolate
+        cache = self._sprite_points
+        points = list()
+        append = points.append
+        for sprite in sprites:
+            if interpolate is None:
+                position = sprite.position
+            else:
+                position = interpolate(sprite)
+            anchor = sprite.anchor
+            key = position[0], position[1], position[2], anchor.x, anchor.y
+
+            # sprites that did not move keep their point
+            try:
+                old_key, point = cache[sprite]
+                if old_key == key:
+                    append(point)
+                    continue
+            except KeyError:
+                pass
+
+            q, r = sprites_to_axial(position)
+            x = size_sqrt3 * (q + r / 2.) + ox
+            y = size_ratio * r + oy
+            point = x - anchor.x, y - anchor.y - position[2]
+            cache[sprite] = key, point
+            append(point)
+        return points
 
     def coords_from_surface(self, point):
         if self.rect is None:
             return None
 
         x, y = point
-        x -= self.pixel_offset.x
-        y -= self.pixel_offset.y
+        x += self.camera.x - self.pixel_offset.x
+        y += self.camera.y - self.pixel_offset.y
         y *= .45
         x *= .8
         return pixel_to_axial((x, y), self.hex_radius * .8)
@@ -202,153 +851,236 @@ class HexMapView(pygame.sprite.LayeredUpdates):
             return
         blit = surface.blit
         _buffer = self.map_buffer
-        spritedict = self.spritedict
-        [blit(_buffer, r, r) for r in self.lostsprites]
-        for key, value in spritedict.items():
-            if value:
-                try:
-                    if key.dirty:
-                        blit(_buffer, value, value)
-                except AttributeError:
-                    blit(_buffer, value, value)
+        ox, oy = self._buffer_offset
+        [blit(_buffer, r, r.move(ox, oy)) for r in self.lostsprites]
+
+        # sprite_grid holds the sprites on the screen
+        for key, value in self.sprite_grid.rects.items():
+            try:
+                if key.dirty:
+                    blit(_buffer, value, value.move(ox, oy))
+            except AttributeError:
+                blit(_buffer, value, value.move(ox, oy))
+
+    def dirty_sprites(self):
+        """get the visible, dirty sprites in the order they are drawn
+
+        Only the sprites the view made dirty and the sprites of
+        self.activity are checked.
+
+        :return: list of sprites
+        """
+        candidates = set(self.awake)
+        self.awake.clear()
+        for sprites in self.activity:
+            candidates.update(sprites)
+
+        order = self._draw_order
+        layers = self._spritelayers
+        sprites = [s for s in candidates
+                   if s in order and s.visible and s.dirty]
+        sprites.sort(key=lambda s: (layers[s], order[s]))
+        return sprites
+
+    @staticmethod
+    def _blit_batch(surface, batch, overdraw, overdraw_rects):
+        """blit the batched sprites, then the upper layers over them
+        """
+        if not batch and not overdraw:
+            return
+        try:
+            surface.blits(batch, False)
+            surface.blits(overdraw, False)
+        except AttributeError:
+            # pygame older than 1.9.4
+            for image, rect in batch:
+                surface.blit(image, rect)
+            for image, rect, area in overdraw:
+                surface.blit(image, rect, area)
+        del batch[:]
+        del overdraw[:]
+        del overdraw_rects[:]
+
+    def add_internal(self, sprite, layer=None):
+        super(HexMapView, self).add_internal(sprite, layer)
+        self._draw_order[sprite] = self._added
+        self._added += 1
+        self.awake.wake(sprite)
 
     def remove_internal(self, sprite):
         super(HexMapView, self).remove_internal(sprite)
+        self.sprite_grid.remove(sprite)
+        self.map_grid.remove(sprite)
+        self.awake.sleep(sprite)
+        self._draw_order.pop(sprite, None)
+        self._sprite_points.pop(sprite, None)
         try:
             del self.dirtydict[sprite]
         except:
             pass
 
     def draw(self, surface):
+        # the projection centers the map in the window
+        if self.rect is not None and not surface.get_size() == self.rect.size:
+            self.needs_cache = True
+
         if self.needs_cache:
-            buffer_size = surface.get_size()
+            self.rect = surface.get_rect()
+            margin = self.scroll_margin * 2
+            buffer_size = self.rect.width + margin, self.rect.height + margin
             self.map_buffer = pygame.Surface(buffer_size, pygame.SRCALPHA)
-            self.map_buffer.blit(self.background, (0, 0))
-            self.rect = self.map_buffer.get_rect()
             self.project = self.get_projection()
             self._hex_draw = self.get_hex_draw()
             self._hex_tile = self.get_hex_tile()
+            self._stamps = dict()
+            self._chunks = None
             self.needs_cache = False
             self.needs_refresh = True
 
-        self.rect = self.map_buffer.get_rect()
+        self.rect = surface.get_rect()
+        self.camera.update(self)
+        viewport = self._viewport()
+        cx, cy = viewport.topleft
         dirty = self.lostsprites
-        project = self.project
-        draw_tile = self._hex_tile
-        draw_hex = self._hex_draw
-        get_cell = self.data.get_cell
         surface_blit = surface.blit
         surface_rect = surface.get_rect()
-        buffer_blit = self.map_buffer.blit
         dirty_append = dirty.append
         spritedict = self.spritedict
+        sprite_grid = self.sprite_grid
+        overlapping = set()
+        occluders = list()
+        wake = self.awake.wake
 
         self.lostsprites = list()
         refreshed = False
+        damaged = list()
+
+        # terrain is cached in chunks, and only cells changed in the model
+        # since the last draw are rendered again
+        version = self.data.version
+        if self._chunks is None:
+            self.render_terrain()
+            self.needs_refresh = True
+        elif not version == self._version:
+            changes = self.data.changed_since(self._version)
+            if changes is None:
+                self.render_terrain()
+                self.needs_refresh = True
+            else:
+                damaged = self.render_cells(changes)
+        self._version = version
+
+        # scrolling only renders terrain when the view leaves the buffer
+        if not self.buffer_rect.contains(viewport):
+            self._move_buffer(viewport)
+        if not self._camera_position == (cx, cy):
+            self._camera_position = cx, cy
+            self.needs_refresh = True
+
+        bx, by = self.buffer_rect.topleft
+        self._buffer_offset = cx - bx, cy - by
+
+        # highlights are kept in the map buffer, so only changes are drawn
+        if self._highlights_changed:
+            damaged.extend(self._update_highlights())
 
-        # draw the cell tiles, a thread will blit the tiles in the background
-        # this is rendering the background and all hex tiles
         if self.needs_refresh:
-            for sprite in spritedict.keys():
-                try:
+            if self.activity is None:
+                for sprite in spritedict.keys():
+                    try:
+                        sprite.dirty = 1
+                    except:
+                        pass
+            else:
+                # sprites that are, or were, on the screen; sprites may
+                # be drawn a little away from their last rect, so the
+                # view is grown by a margin
+                margin = self.sprite_grid_size * 2
+                self.map_grid.query(viewport.inflate(margin, margin),
+                                    overlapping)
+                overlapping.update(sprite_grid.rects)
+                for sprite in overlapping:
                     sprite.dirty = 1
-                except:
-                    pass
-
-            upper_buffer = pygame.Surface(surface.get_size(), pygame.SRCALPHA)
-            buffer2_blit = upper_buffer.blit
-            upper_cells = list()
-
-            # get in draw order
-            ww, hh = self.data.size
-            for rr, qq in product(range(hh), range(ww)):
-                pos = evenr_to_axial((qq, rr))
-                cell = get_cell(pos)
-                pos = Vector2(*project(pos, cell))
-
-                # draw tall columns
-                if cell.height > 0:
-                    rects = list()
-
-                    draw_tile(buffer_blit, self.default_cell, pos)
-                    for i in range(int(ceil(cell.height))):
-                        # pos.y -= self.hex_radius / 2 * float(cell.height)
-                        pos.y -= self.voff / 2
-                        draw_tile(buffer_blit, cell, pos)
-                        rect = draw_tile(buffer2_blit, cell, pos)
-                        rects.append(rect)
-
-                    rect = rects[0].unionall(rects[:1])
-                    surf = pygame.Surface(rect.size, pygame.SRCALPHA)
-                    surf.blit(upper_buffer, (0, 0), rect)
-                    upper_cells.append(UpperLayerRect(surf, rect, 1))
-                else:
-                    draw_tile(buffer_blit, cell, pos)
+                    wake(sprite)
+                overlapping.clear()
 
-            self.layer_quadtree = quadtree.FastQuadTree(upper_cells, 4)
-            rect = surface_blit(self.map_buffer, self.rect)
+            rect = surface_blit(self.map_buffer, (0, 0),
+                                viewport.move(-bx, -by))
             dirty_append(rect)
             self.needs_refresh = False
             refreshed = True
-
-        # draw cell lines (outlines and highlights) to the surface
-        surface.lock()
-        for pos, cell in self.data.cells:
-            if cell in self._selected:
-                fill = self.select_color
-            elif cell is self._hovered:
-                fill = self.hover_color
-            else:
-                continue
-            old_rect = spritedict.get("hover", None)
-            pos = Vector3(*project(pos, cell))
-            rect = draw_hex(surface, pos, self.border_color, fill)
-            if not refreshed:
-                if old_rect:
-                    if rect.colliderect(rect):
-                        dirty_append(rect.union(old_rect))
-                    else:
-                        dirty_append(rect)
-                        dirty_append(rect)
-                else:
-                    dirty_append(rect)
-                spritedict["hover"] = rect
-        surface.unlock()
+        else:
+            for rect in damaged:
+                area = rect.clip(viewport)
+                if not area:
+                    continue
+                rect = area.move(-cx, -cy)
+                dirty_append(surface_blit(self.map_buffer, rect,
+                                          area.move(-bx, -by)))
+                sprite_grid.query(rect, overlapping)
+            for sprite in overlapping:
+                sprite.dirty = 1
+                wake(sprite)
+            overlapping.clear()
 
         overlap_limit = self.overlap_limit
-        for sprite in [s for s in self.sprites() if s.visible & s.dirty]:
-            # hover is the internal name for the tile cursor
-            if sprite == "hover":
-                continue
+        if self.activity is None:
+            sprites = [s for s in self.sprites() if s.visible & s.dirty]
+            self.awake.clear()
+        else:
+            sprites = self.dirty_sprites()
+        points = self.project_sprites(sprites)
+        map_grid = self.map_grid
 
-            pos = sprites_to_axial(sprite.position)
-            x, y = project(pos, use_cache=False)
-            pos = (int(round(x - sprite.anchor.x, 0)),
-                   int(round(y - sprite.anchor.y - sprite.position.z, 0)))
+        # sprites are blit in batches, one for each layer.  the parts of
+        # upper layers that cover them are drawn after the batch, unless
+        # a later sprite would be drawn over them first.
+        batch = list()
+        overdraw = list()
+        overdraw_rects = list()
+        layer = None
+        for sprite, (x, y) in zip(sprites, points):
+            if not sprite._layer == layer:
+                self._blit_batch(surface, batch, overdraw, overdraw_rects)
+                layer = sprite._layer
+
+            pos = int(round(x - cx, 0)), int(round(y - cy, 0))
 
             if not sprite.dirty == 2:
                 sprite.dirty -= 1
+            else:
+                wake(sprite)
 
-            rect = surface_blit(sprite.image, pos)
-            clipped_rect = rect.clip(surface_rect)
-
-            # this will be true if the sprite was blit off the surface
-            if not clipped_rect:
+            # sprites outside of the view are not drawn
+            image = sprite.image
+            rect = image.get_rect(topleft=pos)
+            map_grid.set(sprite, rect.move(cx, cy))
+            if not rect.colliderect(surface_rect):
+                old_rect = spritedict[sprite]
+                if old_rect:
+                    dirty_append(old_rect)
+                    spritedict[sprite] = 0
+                    sprite_grid.remove(sprite)
                 continue
 
+            if overdraw_rects and rect.collidelist(overdraw_rects) > -1:
+                self._blit_batch(surface, batch, overdraw, overdraw_rects)
+            batch.append((image, rect))
+            rect = rect.clip(surface_rect)
+
             old_rect = spritedict[sprite]
             spritedict[sprite] = rect
+            sprite_grid.set(sprite, rect)
 
-            for _sprite, _rect in spritedict.items():
-                if _sprite == "hover":
-                    continue
-
-                if _sprite is sprite or not _rect:
-                    continue
-
-                if rect.colliderect(_rect):
-                    sprite.dirty = 1
+            sprite_grid.query(rect, overlapping)
+            overlapping.discard(sprite)
+            if overlapping:
+                sprite.dirty = 1
+                wake(sprite)
+                for _sprite in overlapping:
                     _sprite.dirty = 1
+                    wake(_sprite)
+                overlapping.clear()
 
             if not refreshed:
                 if old_rect:
@@ -361,13 +1093,17 @@ class HexMapView(pygame.sprite.LayeredUpdates):
                     dirty_append(rect)
 
                 sprite_layer = sprite._layer
-                for up in self.layer_quadtree.hit(rect):
+                map_rect = rect.move(cx, cy)
+                del occluders[:]
+                for up in self.layer_quadtree.query(map_rect, occluders):
                     if sprite_layer <= up.layer + 1:
-                        if rect.bottom < up.bottom - overlap_limit:
-                            overlap = rect.clip(up.rect)
+                        if map_rect.bottom < up.bottom - overlap_limit:
+                            overlap = map_rect.clip(up.rect)
                             if overlap:
-                                surface.set_clip(overlap)
-                                surface_blit(up.surface, up.rect)
-                                surface.set_clip(None)
+                                area = overlap.move(-up.left, -up.top)
+                                dest = overlap.move(-cx, -cy)
+                                overdraw.append((up.surface, dest, area))
+                                overdraw_rects.append(dest)
 
+        self._blit_batch(surface, batch, overdraw, overdraw_rects)
         return dirty
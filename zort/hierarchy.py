@@ -0,0 +1,318 @@
+"""
+Hierarchical pathfinding (HPA*) over an ArrayHexMapModel.
+
+The map is cut into square blocks of even-r offset coords, called
+clusters.  Walkable cells on either side of a cluster border become
+entrances, and the cost between every pair of entrances of a cluster is
+found once.  A long search is then run on the small graph of entrances,
+and only refined cell by cell inside the clusters it passes through.
+"""
+
+from heapq import heappush, heappop
+
+from zort.pathfinding import Search
+
+
+__all__ = ['ClusterGraph']
+
+
+class ClusterGraph(object):
+    """abstract graph of cluster entrances for one PathFinder
+
+    Paths from the graph are close to, but not always, the shortest.
+
+    :param pathfinder: PathFinder of the map
+    :param cluster_size: width and height of a cluster, in cells
+    :param avoid_raised: if True, raised cells cannot be entered
+    """
+
+    def __init__(self, pathfinder, cluster_size=10, avoid_raised=True):
+        self.pathfinder = pathfinder
+        self.cluster_size = cluster_size
+        self.avoid_raised = avoid_raised
+        self._search = Search(pathfinder)
+
+        model = pathfinder.model
+        stride = model.stride
+        self.cluster_columns = -(-stride // cluster_size)
+        cluster_rows = -(-model.rows // cluster_size)
+        count = self.cluster_columns * cluster_rows
+
+        # cluster number of every index
+        self.cluster_of = [0] * pathfinder.size
+
+        # indexes of every cluster, as lists and as sets for searches
+        self.cells = [list() for i in range(count)]
+        for index in model.indexes():
+            row, col = divmod(index, stride)
+            cluster = (row // cluster_size) * self.cluster_columns + \
+                col // cluster_size
+            self.cluster_of[index] = cluster
+            self.cells[cluster].append(index)
+        self.regions = [set(cells) for cells in self.cells]
+
+        # clusters that share a border
+        self.adjacent = [set() for i in range(count)]
+        cluster_of = self.cluster_of
+        for cluster, cells in enumerate(self.cells):
+            for index in cells:
+                for n in pathfinder.neighbors[index]:
+                    other = cluster_of[n]
+                    if not other == cluster:
+                        self.adjacent[cluster].add(other)
+
+        # (low cluster, high cluster) => list of (low index, high index)
+        self.entrances = dict()
+
+        # entrance => {entrance: cost} for entrances in the same cluster
+        self.intra = dict()
+
+        # entrance => {entrance: cost} for the entrance across the border
+        self.links = dict()
+
+        # entrances of each cluster
+        self.nodes = [set() for i in range(count)]
+
+        # statistics for the last search
+        self.expanded = 0
+
+        self._dirty = set(range(count))
+
+    def _walkable(self, index):
+        return not (self.avoid_raised and
+                    self.pathfinder.model.raised_col[index])
+
+    def cell_changed(self, index):
+        """mark the cluster of a changed cell to be rebuilt before use
+        """
+        self._dirty.add(self.cluster_of[index])
+
+    def _find_entrances(self, low, high):
+        """get entrance pairs between two clusters
+
+        Pairs of neighboring cells across the border are grouped into
+        runs where both sides stay connected, and the middle pair of each
+        run is used as the entrance.
+        """
+        cluster_of = self.cluster_of
+        neighbors = self.pathfinder.neighbors
+        walkable = self._walkable
+        by_low = dict()
+        for index in self.cells[low]:
+            if not walkable(index):
+                continue
+            for n in neighbors[index]:
+                if cluster_of[n] == high and walkable(n):
+                    by_low.setdefault(index, list()).append((index, n))
+
+        def touching(a, b):
+            return a == b or b in neighbors[a]
+
+        runs = list()
+        seen = set()
+        for index in sorted(by_low):
+            for pair in by_low[index]:
+                if pair in seen:
+                    continue
+                run = list()
+                stack = [pair]
+                seen.add(pair)
+                while stack:
+                    current = stack.pop()
+                    run.append(current)
+                    a, b = current
+                    for n in (a,) + neighbors[a]:
+                        for other in by_low.get(n, ()):
+                            if other not in seen and touching(b, other[1]):
+                                seen.add(other)
+                                stack.append(other)
+                run.sort()
+                runs.append(run[len(run) // 2])
+        return runs
+
+    def _rebuild(self):
+        if not self._dirty:
+            return
+
+        dirty = self._dirty
+        self._dirty = set()
+
+        # entrances change for every border of a dirty cluster, so the
+        # clusters on the other side must be rebuilt if theirs changed
+        affected = set(dirty)
+        for cluster in dirty:
+            for other in self.adjacent[cluster]:
+                key = min(cluster, other), max(cluster, other)
+                entrances = self._find_entrances(*key)
+                if not entrances == self.entrances.get(key, None):
+                    self.entrances[key] = entrances
+                    affected.add(other)
+
+        for cluster in affected:
+            self._rebuild_cluster(cluster)
+
+        # link costs into a dirty cluster may change without its entrances
+        for cluster in dirty:
+            for other in self.adjacent[cluster]:
+                if other not in affected:
+                    self._rebuild_links(other)
+
+    def _rebuild_cluster(self, cluster):
+        for node in self.nodes[cluster]:
+            self.intra.pop(node, None)
+
+        nodes = self._rebuild_links(cluster)
+        region = self.regions[cluster]
+        for node in nodes:
+            self.intra[node] = self._dijkstra(node, region, nodes)
+
+    def _rebuild_links(self, cluster):
+        cost = self.pathfinder.model.cost_col
+        for node in self.nodes[cluster]:
+            self.links.pop(node, None)
+
+        nodes = set()
+        for other in self.adjacent[cluster]:
+            key = min(cluster, other), max(cluster, other)
+            for low, high in self.entrances.get(key, ()):
+                node, partner = (low, high) if key[0] == cluster \
+                    else (high, low)
+                nodes.add(node)
+                self.links.setdefault(node, dict())[partner] = \
+                    1 + cost[partner]
+        self.nodes[cluster] = nodes
+        return nodes
+
+    def _dijkstra(self, source, region, targets, reverse=False):
+        """get cost between source and targets, only entering region
+
+        :param reverse: if True, the cost from each target to source
+        :return: {target: cost}
+        """
+        pathfinder = self.pathfinder
+        neighbors = pathfinder.neighbors
+        cost = pathfinder.model.cost_col
+        walkable = self._walkable
+        size = pathfinder.size
+        distance = {source: 0}
+        found = dict()
+        heap = [source]
+        while heap:
+            d, index = divmod(heappop(heap), size)
+            if d > distance[index]:
+                continue
+            if index in targets and not index == source:
+                found[index] = d
+
+            # going backwards, the cost is for leaving n and entering index
+            if reverse:
+                if not index == source and not walkable(index):
+                    continue
+                step = d + 1 + cost[index]
+
+            for n in neighbors[index]:
+                if n not in region:
+                    continue
+                if not reverse:
+                    if not walkable(n):
+                        continue
+                    step = d + 1 + cost[n]
+                if step < distance.get(n, step + 1):
+                    distance[n] = step
+                    heappush(heap, step * size + n)
+        return found
+
+    def search(self, start, goal):
+        """find a path between two indexes on the abstract graph
+
+        :return: list of indexes, goal first, start excluded; or None
+        """
+        self._rebuild()
+        cluster_of = self.cluster_of
+        start_cluster = cluster_of[start]
+        goal_cluster = cluster_of[goal]
+        self.expanded = 0
+
+        # short cut for paths that do not leave the cluster
+        if start_cluster == goal_cluster:
+            path = self._refine(start, goal, self.regions[start_cluster])
+            if path is not None:
+                return path
+
+        start_nodes = self.nodes[start_cluster]
+        goal_nodes = self.nodes[goal_cluster]
+        from_start = self._dijkstra(start, self.regions[start_cluster],
+                                    start_nodes)
+        to_goal = self._dijkstra(goal, self.regions[goal_cluster],
+                                 goal_nodes, reverse=True)
+
+        # A* on the entrances, start and goal
+        distance = self.pathfinder.distance
+        intra = self.intra
+        links = self.links
+        g_cost = {start: 0}
+        parent = {start: None}
+        closed = set()
+        heap = [(distance(start, goal), 0, start)]
+        found = False
+        while heap:
+            f, g, node = heappop(heap)
+            if node in closed:
+                continue
+            if node == goal:
+                found = True
+                break
+            closed.add(node)
+            self.expanded += 1
+
+            edges = list()
+            if node == start:
+                edges.append(from_start.items())
+            if node in intra:
+                edges.append(intra[node].items())
+            if node in links:
+                edges.append(links[node].items())
+            if node in to_goal:
+                edges.append(((goal, to_goal[node]),))
+
+            for items in edges:
+                for n, step in items:
+                    if n in closed:
+                        continue
+                    new_g = g + step
+                    if new_g < g_cost.get(n, new_g + 1):
+                        g_cost[n] = new_g
+                        parent[n] = node
+                        heappush(heap, (new_g + distance(n, goal), new_g, n))
+
+        if not found:
+            return None
+
+        abstract = list()
+        node = goal
+        while node is not None:
+            abstract.append(node)
+            node = parent[node]
+        abstract.reverse()
+
+        # refine each hop into cells
+        path = list()
+        for u, v in zip(abstract, abstract[1:]):
+            if v in links.get(u, ()):
+                segment = [v]
+            else:
+                segment = self._refine(u, v, self.regions[cluster_of[v]])
+                if segment is None:
+                    return None
+            segment.extend(path)
+            path = segment
+        return path
+
+    def _refine(self, start, goal, region):
+        if start == goal:
+            return list()
+        search = self._search
+        search.start(start, goal, frozenset(), self.avoid_raised, region)
+        search.run()
+        self.expanded += search.expanded
+        return search.path
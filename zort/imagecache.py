@@ -0,0 +1,73 @@
+"""
+Flipped and scaled copies of sprite images, shared by every entity.
+
+GameEntity.update_image is called whenever an entity turns around or is
+made, and most entities use the same few images at the same scale.  The
+transformed surfaces are kept here, so the work is only done once for
+each (source image, flipped, scale).
+"""
+
+from collections import OrderedDict
+
+from pygame.transform import flip, smoothscale
+
+__all__ = ['TransformCache', 'get_transformed', 'cache']
+
+
+class TransformCache(object):
+    """least recently used cache of transformed images
+
+    Images from the cache are shared, so they must not be drawn on.
+
+    :param size: number of images kept before the oldest is dropped
+    """
+
+    def __init__(self, size=256):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._images = OrderedDict()
+
+    def __len__(self):
+        return len(self._images)
+
+    def clear(self):
+        self._images.clear()
+
+    def get(self, image, flipped, scale):
+        """get an image flipped horizontally and scaled
+
+        :param image: source surface
+        :param flipped: if True, the image is mirrored left to right
+        :param scale: size of the result, relative to the source
+        :return: converted surface with per pixel alpha
+        """
+        key = image, bool(flipped), scale
+        images = self._images
+        try:
+            result = images.pop(key)
+        except KeyError:
+            self.misses += 1
+            w, h = image.get_size()
+            result = smoothscale(flip(image, key[1], 0),
+                                 (int(w * scale), int(h * scale)))
+            result = result.convert_alpha()
+            if len(images) >= self.size:
+                images.popitem(last=False)
+                self.evictions += 1
+        else:
+            self.hits += 1
+
+        images[key] = result
+        return result
+
+
+# cache used by all entities
+cache = TransformCache()
+
+
+def get_transformed(image, flipped, scale):
+    """get a flipped and scaled image from the shared cache
+    """
+    return cache.get(image, flipped, scale)
@@ -5,6 +5,7 @@ from zort import hex_view
 from zort import config
 from zort import gui
 from zort import resources
+from zort import tileatlas
 from zort.environ import util
 from zort.hex_model import *
 from zort.entity import *
@@ -12,37 +13,183 @@ from zort.dialog import Dialog
 from zort.scenes import Scene
 from zort.euclid import Point2, Vector3
 from zort.hero import Hero
-from zort.physics import PhysicsGroup
+from zort import physics
+from zort.physics import PhysicsGroup, BatchPhysicsGroup
+from zort.pathfinding import PathScheduler
+from zort.pathpool import PoolPathScheduler
+from zort.timers import Scheduler
+from zort.activity import ActiveSet
 from zort.levels import loader
 from zort.resources import maps
 from zort.modes.editor import EditMode
 
 
-__all__ = ['LevelScene', 'Task']
+__all__ = ['LevelScene', 'EntityGroup', 'new_model', 'new_physics_group']
+
+
+def new_model():
+    """ create an empty map model, using the storage named in zort.ini
+    """
+    if config.get('world', 'map_storage') == 'array':
+        return ArrayHexMapModel()
+    return HexMapModel()
+
+
+def new_physics_group(model):
+    """ create a physics group, using the mode named in zort.ini
+
+    batch mode needs numpy, and falls back to moving sprites one at a time
+    """
+    if config.get('world', 'physics_mode') == 'batch' and \
+            physics.numpy is not None:
+        return BatchPhysicsGroup(data=model)
+    return PhysicsGroup(data=model)
+
+
+class EntityGroup(pygame.sprite.Group):
+    """ entities of a level, kept in a list for each update phase
+
+    entities declare the phases they take part in with update_phases:
+        'update': update(delta) is called every frame
+        'input':  handle_pygame_events(events) is called when there are
+                  pygame events
+        'think':  handle_internal_events(scene) is called every frame
+
+    entities name the events addressed to them that handle_internal_events
+    looks at in event_types.  for entities that do not think, or sleep, it
+    is only called in frames where they take part in one of them.
+
+    only awake entities are updated and think.  after each update, or after
+    thinking for entities that think, entities that are idle are put to
+    sleep until they are woken with wake_sprite, or an event is addressed
+    to them.  see zort.activity
+
+    the awake entities of each phase are kept in their own ActiveSet, in
+    the order they were added, so a frame only looks at the awake ones
+
+    the lists are made again when entities are added or removed
+
+    entities added are given the timers of the scene with set_scheduler
+    """
+    phases = ('update', 'input', 'think')
+
+    def __init__(self, timers=None, *sprites):
+        self.timers = timers
+        self._order = dict()
+        self._added = 0
+        # every awake entity
+        self.active = ActiveSet()
+        # awake entities of the phases that skip sleeping ones
+        self._awake = dict((phase, ActiveSet(self._order))
+                           for phase in ('update', 'think'))
+        # awake entities that are not updated, and sleep after the update
+        self._resting = ActiveSet(self._order)
+        # entity: the sets it is put in when woken
+        self._sets = dict()
+        self._tables = None
+        self._listeners = None
+        self._seen = set()
+        super(EntityGroup, self).__init__(*sprites)
+
+    def add_internal(self, sprite, *args):
+        super(EntityGroup, self).add_internal(sprite, *args)
+        self._order[sprite] = self._added
+        self._added += 1
+        self._tables = None
+
+        phases = getattr(sprite, 'update_phases', ('update',))
+        sets = [self.active]
+        sets.extend(self._awake[phase] for phase in ('update', 'think')
+                    if phase in phases)
+        if 'update' not in phases:
+            sets.append(self._resting)
+        self._sets[sprite] = sets
+        self.wake_sprite(sprite)
+
+        if self.timers is not None:
+            set_scheduler = getattr(sprite, 'set_scheduler', None)
+            if set_scheduler is not None:
+                set_scheduler(self.timers)
+
+    def remove_internal(self, sprite):
+        super(EntityGroup, self).remove_internal(sprite)
+        self._sleep(sprite)
+        del self._order[sprite]
+        del self._sets[sprite]
+        self._tables = None
+
+    def wake_sprite(self, sprite):
+        sets = self._sets.get(sprite, None)
+        if sets is not None and sprite not in self.active:
+            for active in sets:
+                active.wake(sprite)
+
+    def _sleep(self, sprite):
+        if sprite in self.active:
+            for active in self._sets[sprite]:
+                active.sleep(sprite)
+
+    def _build(self):
+        tables = dict((phase, list()) for phase in self.phases)
+        listeners = dict()
+        for sprite in self.sprites():
+            phases = getattr(sprite, 'update_phases', ('update',))
+            for phase in phases:
+                tables[phase].append(sprite)
+            for event_name in getattr(sprite, 'event_types', ()):
+                listeners.setdefault(event_name, set()).add(sprite)
+        self._tables = dict((k, tuple(v)) for k, v in tables.items())
+        self._listeners = listeners
+
+    def table(self, phase):
+        """ get the entities that take part in a phase, in the order added
+        """
+        if self._tables is None:
+            self._build()
+        return self._tables[phase]
+
+    def awake_in(self, phase):
+        """ get the awake entities that are updated or think, in the order
+        added
+        """
+        return self._awake[phase].sprites()
+
+    def update(self, *args):
+        sleep = self._sleep
+        thinking = self._awake['think']
+        for sprite in self._awake['update'].sprites():
+            sprite.update(*args)
+            if sprite not in thinking and getattr(sprite, 'idle', False):
+                sleep(sprite)
+
+        # entities that are not updated only wake for their events
+        for sprite in self._resting.sprites():
+            sleep(sprite)
+
+    def handle_pygame_events(self, events):
+        for sprite in self.table('input'):
+            sprite.handle_pygame_events(events)
 
-
-class Task(pygame.sprite.Sprite):
-    def __init__(self, callback, interval=0, loops=1, args=None, kwargs=None):
-        assert (callable(callback))
-        assert (loops >= -1)
-        super(Task, self).__init__()
-        self.interval = interval
-        self.loops = loops
-        self.callback = callback
-        self._timer = 0
-        self._args = args if args else list()
-        self._kwargs = kwargs if kwargs else dict()
-        self._loops = loops
-
-    def update(self, delta):
-        self._timer += delta
-        if self._timer >= self.interval:
-            self._timer -= self.interval
-            self.callback(*self._args, **self._kwargs)
-            if not self._loops == -1:
-                self._loops -= 1
-                if self._loops <= 0:
-                    self.kill()
+    def handle_internal_events(self, scene):
+        sleep = self._sleep
+        seen = self._seen
+        for sprite in self._awake['think'].sprites():
+            seen.add(sprite)
+            sprite.handle_internal_events(scene)
+            if getattr(sprite, 'idle', False):
+                sleep(sprite)
+
+        # the rest only if an event was addressed to them
+        if self._tables is None:
+            self._build()
+        bus = scene.events
+        for event_name, listeners in self._listeners.items():
+            for sprite in bus.participants(event_name):
+                if sprite in listeners and sprite not in seen:
+                    seen.add(sprite)
+                    self.wake_sprite(sprite)
+                    sprite.handle_internal_events(scene)
+        seen.clear()
 
 
 class Hud(GameEntity):
@@ -58,18 +205,18 @@ class Hud(GameEntity):
         self._listen = ['dialog-show', 'dialog-hidden', 'dialog-next']
 
     def handle_internal_events(self, scene):
-        all_events = scene.state['events']
-        for event in all_events.get('dialog-show', list()):
+        events = scene.events
+        for event in events.get('dialog-show'):
             self._dialog = resources.get_text(event['heading'])
             text = next(self._dialog)
             self.render_dialog(text)
 
-        for event in all_events.get('dialog-hide', list()):
+        for event in events.get('dialog-hide'):
             scene.needs_refresh = True
             self._dialog = None
             self.surface = None
 
-        for event in all_events.get('dialog-next', list()):
+        for event in events.get('dialog-next'):
             try:
                 text = next(self._dialog)
                 self.render_dialog(text)
@@ -96,13 +243,15 @@ class LevelScene(Scene):
         self.current_level_module = None
         self.velocity_updates = None
         self.internal_event_group = None
-        self.pygame_event_group = None
         self.mode = None
         self.timers = None
         self.dialog = None
         self.view = None
         self.model = None
+        self.pathfinding = None
         self._hero = None
+        self._hero_cell = None
+        self._map_version = None
         self.hud = None
         self.time = None
 
@@ -113,13 +262,24 @@ class LevelScene(Scene):
         self.model = model
         self.view = hex_view.HexMapView(self, self.model,
                                         config.getint('display', 'hex_radius'))
-        self.velocity_updates = PhysicsGroup(data=self.model)
+        self.velocity_updates = new_physics_group(self.model)
+        self.view.interpolate = self.velocity_updates.interpolated_position
+        self.pathfinding = self.new_path_scheduler()
+
+    def new_path_scheduler(self):
+        if self.pathfinding is not None:
+            self.pathfinding.close()
+        budget = config.getfloat('world', 'path_budget')
+        workers = config.getint('world', 'path_workers')
+        if workers > 0:
+            return PoolPathScheduler(self.model, budget, workers)
+        return PathScheduler(self.model, budget)
 
     def new_hero(self):
         # adds new hero, but doesn't remove old one
         self._hero = self.build_entity(Hero, 'alienBlue.png', (1, 1))
         self.velocity_updates.collide_walls.add(self.hero)
-        self.pygame_event_group.add(self._hero)
+        self.view.camera.follow(self._hero)
 
     def build_entity(self, enemy_class, enemy_sprite_file_name, position):
         entity = enemy_class(enemy_sprite_file_name)
@@ -155,14 +315,16 @@ class LevelScene(Scene):
         door_sprite_file_name = 'smallRockStone.png'
         coords = evenr_to_axial(position)
         cell = self.view.data.get_cell(coords)
-        door = Door(door_sprite_file_name, door_key, cell)
+        door = Door(door_sprite_file_name, door_key, cell, coords)
         self.view.add(door)
         self.internal_event_group.add(door)
+        self.events.subscribe('Switch', door.on_switch)
         return door
 
     def move_hero(self, position):
         sx, sy = axial_to_sprites(evenr_to_axial(position))
         self.hero.position = Vector3(sx, sy, 900)
+        self.hero.wake()
 
     def setup(self):
         print("Setting up level scene")
@@ -171,6 +333,8 @@ class LevelScene(Scene):
     def teardown(self):
         print("Tearing down level scene")
         pygame.mixer.music.fadeout(500)
+        self.pathfinding.close()
+        tileatlas.save_all()
 
     def draw(self, surface):
         dirty = list()
@@ -221,26 +385,52 @@ class LevelScene(Scene):
     def clear(self, surface):
         self.view.clear(surface)
 
+    def wake_thinkers(self):
+        """ wake the entities that think and may have something new to do
+
+        enemies sleep while the hero is out of their reach, see Enemy.idle.
+        they are all woken when the map changed, and the ones near the hero
+        when the hero moved to another cell
+        """
+        group = self.internal_event_group
+        hero = self._hero
+        cell = None if hero is None else sprites_to_hex(hero.position)
+        version = self.model.version
+        if not version == self._map_version:
+            self._map_version = version
+            self._hero_cell = cell
+            for sprite in group.table('think'):
+                group.wake_sprite(sprite)
+
+        elif not cell == self._hero_cell:
+            self._hero_cell = cell
+            position = hero.position
+            for sprite in group.table('think'):
+                near = getattr(sprite, 'near', None)
+                if near is None or near(position, sprite.wake_margin):
+                    group.wake_sprite(sprite)
+
     def update(self, delta, events):
+        self.wake_thinkers()
         self.timers.update(delta)
 
         self.internal_event_group.update(delta)
 
         if len(events):
-            for entity in self.pygame_event_group:
-                if hasattr(entity, "handle_pygame_events"):
-                    entity.handle_pygame_events(events)
+            self.internal_event_group.handle_pygame_events(events)
 
         if self.current_level_module:
             self.current_level_module.handle_internal_events(self)
 
-        for sprite in self.internal_event_group:
-            if hasattr(sprite, "handle_internal_events"):
-                sprite.handle_internal_events(self)
+        self.internal_event_group.handle_internal_events(self)
+
+        self.events.dispatch(self)
 
         if self.mode is not None:
             self.mode.update(delta, events)
 
+        self.pathfinding.update()
+
         self.velocity_updates.update(delta, self)
 
     def resume(self):
@@ -251,21 +441,32 @@ class LevelScene(Scene):
 
     def load_level(self, level_name=None):
         # teardown whatever needs to be torn down here
-        self.model = HexMapModel()
+        self.clear_events()
+        self.model = new_model()
         self.view = hex_view.HexMapView(
             self, self.model, config.getint('display', 'hex_radius'))
         self.movement_accel = config.getfloat('world', 'player_move_accel')
         self.damage = dict()
         self.needs_refresh = True
-        self.velocity_updates = PhysicsGroup(data=self.model)
-        self.internal_event_group = pygame.sprite.Group()
-        self.pygame_event_group = pygame.sprite.Group()
-        self.timers = pygame.sprite.Group()
+        self.velocity_updates = new_physics_group(self.model)
+        self.view.interpolate = self.velocity_updates.interpolated_position
+        self.pathfinding = self.new_path_scheduler()
+        self.timers = Scheduler()
+        self.internal_event_group = EntityGroup(self.timers)
+        self._hero_cell = None
+        self._map_version = None
+        self.view.activity = (self.velocity_updates.stepped,
+                              self.internal_event_group.active)
         self.mode = EditMode(self)
         self.dialog = Dialog()
+        self.dialog.subscribe(self.events)
         self.internal_event_group.add(self.dialog)
         self.build_hud()
         self.new_hero()
         if level_name is None:
             level_name = next((k for k in maps.keys()))
         self.current_level_module = loader.load_level(level_name, self)
+
+        # build the neighbor table now, not in the first frame an enemy
+        # looks for a path
+        getattr(self.model, 'pathfinder', None)
@@ -5,7 +5,6 @@ Evil Hexagonians!
 from zort.entity import *
 from zort.enemies import *
 from zort.hero import Hero
-from zort.level import Task
 from zort import hex_model
 
 
@@ -49,8 +48,7 @@ def setup_level(level_scene):
     def show_dialog():
         level_scene.raise_event("scene", "dialog-show",
                                 heading="Evil Hexagonians")
-    t = Task(show_dialog, 1000)
-    level_scene.timers.add(t)
+    level_scene.timers.schedule(show_dialog, 1000)
 
 
 def handle_internal_events(level_scene):
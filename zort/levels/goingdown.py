@@ -13,7 +13,6 @@ an obvious path, one door and one switch to go through.
 from zort.entity import *
 from zort.enemies import *
 from zort.hero import Hero
-from zort.level import Task
 from zort import hex_model
 from zort import resources
 
@@ -39,8 +38,7 @@ def setup_level(level_scene):
     def show_dialog():
         level_scene.raise_event("scene", "dialog-show",
                                 heading="Going Down!")
-    t = Task(show_dialog, 1000)
-    level_scene.timers.add(t)
+    level_scene.timers.schedule(show_dialog, 1000)
 
 
 def handle_internal_events(level_scene):
@@ -13,7 +13,6 @@ an obvious path, one door and one switch to go through.
 from zort.entity import *
 from zort.enemies import *
 from zort.hero import Hero
-from zort.level import Task
 from zort import hex_model
 
 
@@ -50,8 +49,7 @@ def setup_level(level_scene):
     level_scene.add_entity(e, (16, 10))
 
     # # start the silly timer to drop powerups
-    # #timer = Task(self.new_powerup, 5000, -1)
-    # #self.timers.add(timer)
+    # #self.timers.schedule(self.new_powerup, 5000, -1)
 
 
 def handle_internal_events(level_scene):
@@ -14,7 +14,6 @@ import pygame, sys
 from zort.entity import *
 from zort.enemies import *
 from zort.hero import Hero
-from zort.level import Task
 from zort import hex_model
 
 
@@ -46,8 +45,7 @@ def setup_level(level_scene):
         level_scene.raise_event("scene", "dialog-show",
                                 heading="So Long")
 
-    t = Task(show_dialog, 1000)
-    level_scene.timers.add(t)
+    level_scene.timers.schedule(show_dialog, 1000)
 
 def handle_internal_events(level_scene):
     """
@@ -8,9 +8,7 @@ __all__ = ['EditMode']
 
 
 class EditMode(LevelSceneMode):
-    def handle_click(self, button, cell):
-        view = self.scene.view
-
+    def handle_click(self, button, cell, coords=None):
         # left click
         if button == 1:
             cell.raised = not cell.raised
@@ -21,7 +19,8 @@ class EditMode(LevelSceneMode):
                 cell.height = 0
                 cell.filename = 'tileGrass.png'
 
-            view.needs_refresh = True
+            # the view renders again only what the change touched
+            self.scene.model.cell_changed(coords)
 
     def update(self, delta, events):
         super(EditMode, self).update(delta, events)
@@ -9,7 +9,7 @@ class LevelSceneMode(object):
     def __init__(self, scene):
         self.scene = scene
 
-    def handle_click(self, button, cell):
+    def handle_click(self, button, cell, coords=None):
         pass
 
     def draw(self, surface):
@@ -21,6 +21,12 @@ class LevelSceneMode(object):
         #    _coords = hex_round(_coords)
         return self.scene.view.cell_from_surface(coords)
 
+    def get_nearest_coords(self, coords):
+        _coords = self.scene.view.coords_from_surface(coords)
+        if _coords is not None:
+            _coords = int(_coords[0]), int(_coords[1])
+        return _coords
+
     def update(self, delta, events):
         return
 
@@ -28,9 +34,11 @@ class LevelSceneMode(object):
             if event.type == MOUSEMOTION:
                 cell = self.get_nearest_cell(event.pos)
                 if cell:
-                    self.scene.view.highlight_cell(cell)
+                    self.scene.view.highlight_cell(
+                        cell, self.get_nearest_coords(event.pos))
 
             if event.type == MOUSEBUTTONUP:
                 cell = self.get_nearest_cell(event.pos)
                 if cell:
-                    self.handle_click(event.button, cell)
+                    self.handle_click(event.button, cell,
+                                      self.get_nearest_coords(event.pos))
@@ -0,0 +1,622 @@
+"""
+Pathfinding over the linear cell indexes of an ArrayHexMapModel.
+"""
+
+from array import array
+from functools import partial
+from heapq import heappush, heappop, heapify
+import time
+
+from zort.environ import util
+
+
+__all__ = ['PathFinder', 'Search', 'FlowField', 'PathRequest',
+           'PathScheduler']
+
+
+class PathFinder(object):
+    """A* search that works on linear cell indexes instead of coords
+
+    The neighbor table is built once for a map layout and shared by every
+    search.  Cell cost is added to the cost of entering a cell, and the
+    heuristic is the hex distance to the goal, which never overestimates.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.size = size = model.stride * model.rows
+
+        # search statistics for the last search
+        self.expanded = 0
+
+        # axial coords of each index, for the heuristic
+        self.q_col = array('i', [0]) * size
+        self.r_col = array('i', [0]) * size
+
+        # tuple of neighboring indexes for each index
+        self.neighbors = [()] * size
+
+        index_of = model.index_of
+        for index in model.indexes():
+            q, r = model.coords_of(index)
+            self.q_col[index] = q
+            self.r_col[index] = r
+            neighbors = list()
+            for dq, dr in util.neighbor_mat:
+                n = index_of((q + dq, r + dr))
+                if n is not None:
+                    neighbors.append(n)
+            self.neighbors[index] = tuple(neighbors)
+
+        # used to pack (f, h, index) into one int for the heap
+        self.h_scale = 2 * (model.stride + model.rows) + 1
+
+        self._search = Search(self)
+
+    def distance(self, index0, index1):
+        """hex distance between two indexes
+        """
+        dq = self.q_col[index0] - self.q_col[index1]
+        dr = self.r_col[index0] - self.r_col[index1]
+        return (abs(dq) + abs(dr) + abs(dq + dr)) >> 1
+
+    def within_radius(self, center, radius, avoid_raised=True):
+        """get set of indexes that can be reached from center in radius steps
+        """
+        raised = self.model.raised_col
+        neighbors = self.neighbors
+        region = {center}
+        frontier = [center]
+        for i in range(radius):
+            next_frontier = list()
+            for index in frontier:
+                for n in neighbors[index]:
+                    if n in region or (avoid_raised and raised[n]):
+                        continue
+                    region.add(n)
+                    next_frontier.append(n)
+            frontier = next_frontier
+        return region
+
+    def search(self, start, goal, blocked=frozenset(), avoid_raised=True,
+               region=None, limit=None):
+        """find a path between two indexes
+
+        :param start: index to start from
+        :param goal: index to find
+        :param blocked: set of indexes that cannot be entered
+        :param avoid_raised: if True, raised cells cannot be entered
+        :param region: if not None, only these indexes can be entered
+        :param limit: max number of nodes to expand before giving up, or
+                      None for no limit
+        :return: list of indexes, goal first, start excluded; or None
+        """
+        search = self._search
+        search.start(start, goal, blocked, avoid_raised, region)
+        search.run(limit)
+        self.expanded = search.expanded
+        return search.path
+
+
+class Search(object):
+    """one A* search over a PathFinder that can be run in slices
+
+    The scratch buffers are reused for every search started on this
+    object.  They are stamped with a search number instead of being
+    cleared, so starting a search does not touch every cell of the map.
+    """
+
+    def __init__(self, pathfinder):
+        self.pathfinder = pathfinder
+        size = pathfinder.size
+        self.g_cost = array('i', [0]) * size
+        self.parent = array('i', [-1]) * size
+        self.seen = array('i', [0]) * size
+        self.closed = array('i', [0]) * size
+        self.stamp = 0
+        self.heap = list()
+        self.start_index = None
+        self.goal = None
+        self.blocked = frozenset()
+        self.avoid_raised = True
+        self.region = None
+        self.expanded = 0
+        self.finished = True
+        self.path = None
+
+    def start(self, start, goal, blocked=frozenset(), avoid_raised=True,
+              region=None):
+        """begin a new search, see PathFinder.search for the arguments
+        """
+        self.stamp += 1
+        self.start_index = start
+        self.goal = goal
+        self.blocked = blocked
+        self.avoid_raised = avoid_raised
+        self.region = region
+        self.expanded = 0
+        self.finished = False
+        self.path = None
+
+        h_scale = self.pathfinder.h_scale
+        size = self.pathfinder.size
+        heap = self.heap
+        del heap[:]
+        self.seen[start] = self.stamp
+        self.g_cost[start] = 0
+        self.parent[start] = -1
+        h = self.pathfinder.distance(start, goal)
+        heappush(heap, (h * h_scale + h) * size + start)
+
+    def run(self, limit=None):
+        """expand nodes until the search is finished or limit is reached
+
+        :param limit: max number of nodes to expand, or None for no limit
+        :return: True if the search is finished
+        """
+        if self.finished:
+            return True
+
+        pathfinder = self.pathfinder
+        stamp = self.stamp
+        size = pathfinder.size
+        h_scale = pathfinder.h_scale
+        g_cost = self.g_cost
+        parent = self.parent
+        seen = self.seen
+        closed = self.closed
+        neighbors = pathfinder.neighbors
+        q_col = pathfinder.q_col
+        r_col = pathfinder.r_col
+        cost = pathfinder.model.cost_col
+        raised = pathfinder.model.raised_col
+        blocked = self.blocked
+        avoid_raised = self.avoid_raised
+        region = self.region
+        goal = self.goal
+        gq = q_col[goal]
+        gr = r_col[goal]
+        heap = self.heap
+
+        expanded = 0
+        while heap:
+            if limit is not None and expanded >= limit:
+                self.expanded += expanded
+                return False
+
+            current = heappop(heap) % size
+            if closed[current] == stamp:
+                continue
+
+            if current == goal:
+                break
+
+            closed[current] = stamp
+            expanded += 1
+            base_cost = g_cost[current] + 1
+            for n in neighbors[current]:
+                if closed[n] == stamp:
+                    continue
+                if avoid_raised and raised[n]:
+                    continue
+                if n in blocked:
+                    continue
+                if region is not None and n not in region:
+                    continue
+
+                g = base_cost + cost[n]
+                if seen[n] == stamp and g >= g_cost[n]:
+                    continue
+
+                seen[n] = stamp
+                g_cost[n] = g
+                parent[n] = current
+                dq = q_col[n] - gq
+                dr = r_col[n] - gr
+                h = (abs(dq) + abs(dr) + abs(dq + dr)) >> 1
+                heappush(heap, ((g + h) * h_scale + h) * size + n)
+        else:
+            self.expanded += expanded
+            self.finished = True
+            return True
+
+        self.expanded += expanded
+        self.finished = True
+        path = list()
+        start = self.start_index
+        while current != start:
+            path.append(current)
+            current = parent[current]
+        self.path = path
+        return True
+
+
+class FlowField(object):
+    """Dijkstra map toward one goal index, shared by everything chasing it
+
+    After build, next_index holds the neighbor to step to from every cell
+    that can reach the goal, so following the field costs one lookup per
+    step instead of one search per follower.
+
+    A field built with a limit stops spreading once the cost to the goal
+    passes it, and only covers the cells within the limit.
+    """
+
+    def __init__(self, pathfinder):
+        self.pathfinder = pathfinder
+        size = pathfinder.size
+        self.goal = None
+        self.avoid_raised = True
+        self.version = None
+        self.limit = None
+        # largest limit asked for since the field was built, see
+        # ArrayHexMapModel.flow_field
+        self.wanted = 0
+        self.cost = array('i', [-1]) * size
+        self.next_index = array('i', [-1]) * size
+        self._unset = array('i', [-1]) * size
+        self._heap = list()
+
+    def build(self, goal, avoid_raised=True, version=None, limit=None):
+        """fill the field for a goal index
+
+        :param goal: index that every cell will flow toward
+        :param avoid_raised: if True, raised cells cannot be entered
+        :param version: map version the field is built from
+        :param limit: highest cost to the goal to fill, or None for all
+        """
+        self.goal = goal
+        self.avoid_raised = avoid_raised
+        self.version = version
+        self.limit = limit
+
+        cost = self.cost
+        next_index = self.next_index
+        cost[:] = self._unset
+        next_index[:] = self._unset
+
+        heap = self._heap
+        del heap[:]
+        cost[goal] = 0
+        heap.append(goal)
+        self._propagate()
+
+    def update_cell(self, index):
+        """repair the field after the cell at index changed
+
+        Only cells that were routed through index, and cells that can now
+        be routed through it, are visited.  The cell itself keeps its
+        route, because the state of a cell only matters when entering it.
+        """
+        pathfinder = self.pathfinder
+        size = pathfinder.size
+        neighbors = pathfinder.neighbors
+        cell_cost = pathfinder.model.cost_col
+        raised = pathfinder.model.raised_col
+        avoid_raised = self.avoid_raised
+        goal = self.goal
+        cost = self.cost
+        next_index = self.next_index
+
+        # forget the route of every cell that passed through index
+        orphans = list()
+        stack = [n for n in neighbors[index] if next_index[n] == index]
+        while stack:
+            orphan = stack.pop()
+            cost[orphan] = -1
+            next_index[orphan] = -1
+            orphans.append(orphan)
+            stack.extend(n for n in neighbors[orphan]
+                         if next_index[n] == orphan)
+
+        # reconnect them, and index, to the best valid neighbor
+        heap = self._heap
+        del heap[:]
+        orphans.append(index)
+        for orphan in orphans:
+            if orphan == goal:
+                continue
+            best = cost[orphan]
+            for n in neighbors[orphan]:
+                c = cost[n]
+                if c < 0 or (avoid_raised and raised[n] and not n == goal):
+                    continue
+                step = c + 1 + cell_cost[n]
+                if best < 0 or step < best:
+                    best = step
+                    cost[orphan] = step
+                    next_index[orphan] = n
+            if best >= 0:
+                heappush(heap, best * size + orphan)
+
+        self._propagate()
+
+    def _propagate(self):
+        pathfinder = self.pathfinder
+        size = pathfinder.size
+        neighbors = pathfinder.neighbors
+        cell_cost = pathfinder.model.cost_col
+        raised = pathfinder.model.raised_col
+        avoid_raised = self.avoid_raised
+        goal = self.goal
+        cost = self.cost
+        next_index = self.next_index
+        limit = self.limit
+        heap = self._heap
+        while heap:
+            d, index = divmod(heappop(heap), size)
+            if d > cost[index]:
+                continue
+
+            # cells past the limit are not covered, so are not needed
+            if limit is not None and d >= limit:
+                del heap[:]
+                break
+
+            # followers can leave a raised cell, but not pass through one
+            if avoid_raised and raised[index] and not index == goal:
+                continue
+
+            step = d + 1 + cell_cost[index]
+            for n in neighbors[index]:
+                c = cost[n]
+                if c < 0 or step < c:
+                    cost[n] = step
+                    next_index[n] = index
+                    heappush(heap, step * size + n)
+
+    def covers(self, index):
+        """True if the route from index to the goal is known
+
+        Cells outside of the limit may still reach the goal.
+        """
+        c = self.cost[index]
+        return c >= 0 and (self.limit is None or c <= self.limit)
+
+    def reaches(self, limit):
+        """True if the field covers every cell within limit of the goal
+        """
+        return self.limit is None or (limit is not None and
+                                      limit <= self.limit)
+
+    def next_step(self, index):
+        """get index of next step toward the goal, or None
+        """
+        if not self.covers(index):
+            return None
+        n = self.next_index[index]
+        return None if n < 0 else n
+
+    def path(self, index):
+        """get the indexes from index to the goal, goal first and index
+        excluded, or None if index is not covered
+        """
+        if not self.covers(index):
+            return None
+        goal = self.goal
+        next_index = self.next_index
+        path = list()
+        while not index == goal:
+            index = next_index[index]
+            if index < 0:
+                return None
+            path.append(index)
+        path.reverse()
+        return path
+
+
+class PathRequest(object):
+    """handle for a path search run by a PathScheduler
+
+    Like a future, done() tells if the search has finished and result()
+    returns (path, version): the path in axial coords, goal first, or
+    None, and the map version the path was found at.
+
+    pathfinder is the PathFinder the cell indexes of search_args belong
+    to, or None if they are coords.
+
+    If owner is set, owner.wake() is called when the result is set.
+    """
+
+    def __init__(self, search_args, priority, version, pathfinder=None):
+        self.search_args = search_args
+        self.priority = priority
+        self.version = version
+        self.pathfinder = pathfinder
+        self.owner = None
+        self.path = None
+        self._done = False
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+        return not self._done
+
+    def cancelled(self):
+        return self._cancelled
+
+    def done(self):
+        return self._done or self._cancelled
+
+    def result(self):
+        assert (self._done)
+        return self.path, self.version
+
+    def set_result(self, path):
+        self.path = path
+        self._done = True
+        if self.owner is not None:
+            self.owner.wake()
+
+
+class PathScheduler(object):
+    """runs path requests under one time budget per frame
+
+    Searches are run in slices and resumed on the next frame when the
+    budget runs out, so the time spent does not depend on the number of
+    requests.  Requests with a lower priority number are run first.
+
+    Models without a PathFinder are searched with their own pathfind
+    methods, one whole search per slice.
+    """
+
+    # nodes to expand between checks of the clock
+    slice_size = 32
+
+    def __init__(self, model, budget):
+        """
+        :param model: HexMapModel to search
+        :param budget: time to spend per frame, in milliseconds
+        """
+        self.model = model
+        self.budget = budget / 1000.
+        self._queue = list()
+        self._order = 0
+        self._active = None
+        self._search = None
+        # pathfinder of the map layout the queue was last checked against
+        self._pathfinder = None
+
+        # statistics for the last update
+        self.expanded = 0
+        self.finished = 0
+
+    def __len__(self):
+        return len(self._queue) + (self._active is not None)
+
+    def submit(self, current, end, blacklist=set(), avoid_raised=True,
+               priority=1):
+        """queue a HexMapModel.pathfind search
+
+        :return: PathRequest
+        """
+        model = self.model
+        if hasattr(model, 'pathfind_args'):
+            args = model.pathfind_args(current, end, blacklist, avoid_raised)
+        else:
+            args = partial(model.pathfind, current, end, set(blacklist),
+                           avoid_raised)
+        return self._push(args, priority)
+
+    def submit_ramble(self, current, home, radius, blacklist=set(),
+                      avoid_raised=True, priority=1):
+        """queue a HexMapModel.pathfind_ramble search
+
+        :return: PathRequest
+        """
+        model = self.model
+        if hasattr(model, 'ramble_args'):
+            args = model.ramble_args(current, home, radius, blacklist,
+                                     avoid_raised)
+        else:
+            args = partial(model.pathfind_ramble, current, home, radius,
+                           set(blacklist), avoid_raised)
+        return self._push(args, priority)
+
+    def _push(self, args, priority):
+        model = self.model
+        request = PathRequest(args, priority, model.version,
+                              getattr(model, 'pathfinder', None))
+        if args is None:
+            request.set_result(None)
+        else:
+            self._order += 1
+            heappush(self._queue, (priority, self._order, request))
+        return request
+
+    def close(self):
+        """cancel everything and release resources held by the scheduler
+        """
+        self.cancel_all()
+
+    def cancel_all(self):
+        for priority, order, request in self._queue:
+            request.cancel()
+        del self._queue[:]
+        if self._active is not None:
+            self._active.cancel()
+            self._active = None
+
+    def _is_stale(self, request):
+        return request.pathfinder is not None and \
+            request.pathfinder is not self._pathfinder
+
+    def cancel_stale(self):
+        """cancel requests made for an older layout of the map
+
+        Their cell indexes are useless once the map layout changed, and
+        the pathfinder of the model was replaced.  Requests made after the
+        change are kept.
+
+        :return: True if the layout changed since the last check
+        """
+        pathfinder = getattr(self.model, 'pathfinder', None)
+        if pathfinder is self._pathfinder:
+            return False
+        self._pathfinder = pathfinder
+
+        queue = list()
+        for entry in self._queue:
+            if self._is_stale(entry[2]):
+                entry[2].cancel()
+            else:
+                queue.append(entry)
+        if len(queue) < len(self._queue):
+            heapify(queue)
+            self._queue = queue
+
+        if self._active is not None and self._is_stale(self._active):
+            self._active.cancel()
+            self._active = None
+        if self._search is not None and \
+                self._search.pathfinder is not pathfinder:
+            self._search = None
+        return True
+
+    def update(self):
+        """run queued searches until the frame budget is spent
+        """
+        self.expanded = 0
+        self.finished = 0
+        if not self._queue and self._active is None:
+            return
+
+        deadline = time.time() + self.budget
+        model = self.model
+        self.cancel_stale()
+        pathfinder = self._pathfinder
+
+        while True:
+            request = self._active
+            if request is not None and request.cancelled():
+                self._active = request = None
+
+            if request is None:
+                if not self._queue:
+                    break
+                request = heappop(self._queue)[2]
+                if request.cancelled():
+                    continue
+
+                if callable(request.search_args):
+                    request.set_result(request.search_args()[0])
+                    self.finished += 1
+                else:
+                    if self._search is None:
+                        self._search = Search(pathfinder)
+                    self._search.start(*request.search_args)
+                    self._active = request
+
+            if self._active is not None:
+                search = self._search
+                before = search.expanded
+                finished = search.run(self.slice_size)
+                self.expanded += search.expanded - before
+                if finished:
+                    self._active = None
+                    if not request.cancelled():
+                        request.set_result(model.path_coords(search.path))
+                        self.finished += 1
+
+            if time.time() >= deadline:
+                break
@@ -0,0 +1,205 @@
+"""
+Path searches run in a pool of worker processes.
+
+The walkable grid is written to a snapshot file once per map version,
+and workers load it the first time they see a new file, so a search
+only sends its arguments to the worker.
+"""
+
+import os
+import pickle
+import shutil
+import tempfile
+
+try:
+    from concurrent.futures import ProcessPoolExecutor
+except ImportError:
+    ProcessPoolExecutor = None
+
+from zort.hex_model import ArrayHexMapModel
+from zort.pathfinding import PathScheduler
+
+
+__all__ = ['PoolPathScheduler']
+
+# snapshot loaded by this worker process
+_worker_model = None
+_worker_snapshot = None
+
+
+def _search(snapshot_path, search_args):
+    global _worker_model, _worker_snapshot
+
+    if not snapshot_path == _worker_snapshot:
+        with open(snapshot_path, 'rb') as fob:
+            snapshot = pickle.load(fob)
+        if _worker_model is None:
+            _worker_model = ArrayHexMapModel()
+        _worker_model.load_snapshot(snapshot)
+        _worker_snapshot = snapshot_path
+
+    return _worker_model.pathfinder.search(*search_args)
+
+
+class PoolPathScheduler(PathScheduler):
+    """PathScheduler that runs searches in worker processes
+
+    Results are checked against the map version of the snapshot they were
+    searched on.  A result from before a door toggle is thrown away and
+    the request is searched again on the new snapshot.
+
+    If a pool cannot be started or breaks, searches are run in this
+    process under the frame budget, like PathScheduler.
+    """
+
+    def __init__(self, model, budget, workers):
+        super(PoolPathScheduler, self).__init__(model, budget)
+        self.workers = workers
+        self._pool = None
+        self._pending = list()
+        self._snapshot_dir = None
+        self._snapshots = list()
+        self._snapshot_version = None
+
+        if ProcessPoolExecutor is not None and hasattr(model, 'snapshot'):
+            try:
+                self._pool = ProcessPoolExecutor(workers)
+                self._snapshot_dir = tempfile.mkdtemp(prefix='zort-paths-')
+            except (OSError, NotImplementedError, ImportError):
+                self._pool = None
+
+    def __len__(self):
+        return super(PoolPathScheduler, self).__len__() + len(self._pending)
+
+    def close(self):
+        super(PoolPathScheduler, self).close()
+        self._stop_pool()
+
+    def cancel_all(self):
+        super(PoolPathScheduler, self).cancel_all()
+        for future, request, version in self._pending:
+            future.cancel()
+            request.cancel()
+        del self._pending[:]
+
+    def cancel_stale(self):
+        if not super(PoolPathScheduler, self).cancel_stale():
+            return False
+        # the layout can change without a new version
+        self._snapshot_version = None
+        pending = list()
+        for future, request, version in self._pending:
+            if self._is_stale(request):
+                future.cancel()
+                request.cancel()
+            else:
+                pending.append((future, request, version))
+        self._pending = pending
+        return True
+
+    def _stop_pool(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+        if self._snapshot_dir is not None:
+            shutil.rmtree(self._snapshot_dir, ignore_errors=True)
+            self._snapshot_dir = None
+
+    def _requeue(self, request):
+        self._order += 1
+        self._queue.append((request.priority, self._order, request))
+
+    def _publish(self):
+        """write a snapshot of the map if it changed since the last one
+        """
+        model = self.model
+        if self._snapshot_version == model.version:
+            return
+
+        path = os.path.join(self._snapshot_dir,
+                            '%d-%d.snapshot' % (model.version, self._order))
+        with open(path, 'wb') as fob:
+            pickle.dump(model.snapshot(), fob, pickle.HIGHEST_PROTOCOL)
+        self._snapshot_version = model.version
+        self._snapshots.append(path)
+
+        # searches still using older snapshots will fail and be requeued
+        while len(self._snapshots) > 2:
+            os.remove(self._snapshots.pop(0))
+
+    def update(self):
+        if self._pool is None:
+            return super(PoolPathScheduler, self).update()
+
+        self.expanded = 0
+        self.finished = 0
+        model = self.model
+        broken = False
+        self.cancel_stale()
+
+        pending = list()
+        for future, request, version in self._pending:
+            if not future.done():
+                pending.append((future, request, version))
+                continue
+
+            if request.cancelled():
+                continue
+
+            try:
+                path = future.result()
+            except (IOError, OSError, EOFError):
+                self._requeue(request)
+                continue
+            except Exception:
+                broken = True
+                self._requeue(request)
+                continue
+
+            if version == model.version:
+                request.version = version
+                request.set_result(model.path_coords(path))
+                self.finished += 1
+            else:
+                self._requeue(request)
+        self._pending = pending
+
+        if broken:
+            self.cancel_pending()
+
+        self._queue.sort()
+        if self._pool is None:
+            return super(PoolPathScheduler, self).update()
+        if not self._queue:
+            return
+
+        self._publish()
+        snapshot = self._snapshots[-1]
+        while self._queue and len(self._pending) < self.workers * 2:
+            priority, order, request = self._queue.pop(0)
+            if request.cancelled():
+                continue
+
+            # cluster graph searches are quick and need the whole graph
+            if callable(request.search_args):
+                request.set_result(request.search_args()[0])
+                self.finished += 1
+                continue
+            try:
+                future = self._pool.submit(_search, snapshot,
+                                           request.search_args)
+            except Exception:
+                self._requeue(request)
+                self.cancel_pending()
+                return super(PoolPathScheduler, self).update()
+            self._pending.append((future, request, model.version))
+
+    def cancel_pending(self):
+        """stop using the pool, and requeue searches sent to it
+        """
+        for future, request, version in self._pending:
+            future.cancel()
+            self._requeue(request)
+        del self._pending[:]
+        self._stop_pool()
+        self._queue.sort()
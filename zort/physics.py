@@ -1,139 +1,549 @@
+from math import ceil
+
 import pygame
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from zort.activity import ActiveSet
 from zort.euclid import Vector3
 from zort import config
 from zort.hex_model import *
 
-__all__ = ['PhysicsGroup']
+__all__ = ['PhysicsGroup', 'BatchPhysicsGroup', 'SpatialHash', 'cell_reach']
+
+
+def cell_reach(distance):
+    """get how many rings of cells to search for circles that may overlap
+
+    Sprites are bucketed by the nearest cell center, which is at most 1
+    away in the units of collide_hex, and cells n rings apart have centers
+    at least 1.5 * n apart.
+
+    :param distance: sum of the radii of both circles
+    :return: number of rings around the cell to search
+    """
+    return max(0, int(ceil((2 + distance) / 1.5)) - 1)
+
+
+class SpatialHash(object):
+    """buckets of sprites keyed by the rounded axial cell of each sprite
+
+    Buckets are only changed when a sprite crosses into another cell.
+    """
+
+    def __init__(self):
+        self.buckets = dict()
+        self.cell_of = dict()
+        self._last = dict()
+        self._rings = dict()
+
+    def __len__(self):
+        return len(self.cell_of)
+
+    def __contains__(self, sprite):
+        return sprite in self.cell_of
+
+    def add(self, sprite):
+        if sprite not in self.cell_of:
+            self._last[sprite] = None
+            self.cell_of[sprite] = None
+            self.move(sprite)
+
+    def remove(self, sprite):
+        cell = self.cell_of.pop(sprite, None)
+        del self._last[sprite]
+        bucket = self.buckets.get(cell, None)
+        if bucket is not None:
+            bucket.discard(sprite)
+            if not bucket:
+                del self.buckets[cell]
+
+    def move(self, sprite):
+        """update the bucket of a sprite after its position changed
+        """
+        position = sprite.position
+        xy = position.x, position.y
+        if self._last[sprite] == xy:
+            return
+        self._last[sprite] = xy
+
+        q, r = hex_round(sprites_to_axial(xy))
+        cell = int(q), int(r)
+        old = self.cell_of[sprite]
+        if cell == old:
+            return
+
+        if old is not None:
+            bucket = self.buckets[old]
+            bucket.discard(sprite)
+            if not bucket:
+                del self.buckets[old]
+        self.cell_of[sprite] = cell
+        try:
+            self.buckets[cell].add(sprite)
+        except KeyError:
+            self.buckets[cell] = {sprite}
+
+    def ring_offsets(self, reach):
+        """get axial offsets of all cells within reach rings of a cell
+        """
+        try:
+            return self._rings[reach]
+        except KeyError:
+            offsets = list()
+            for dq in range(-reach, reach + 1):
+                for dr in range(max(-reach, -dq - reach),
+                                min(reach, -dq + reach) + 1):
+                    offsets.append((dq, dr))
+            self._rings[reach] = offsets
+            return offsets
+
+    def query(self, sprite, reach, result):
+        """add sprites near the cell of a sprite to a set
+
+        :param sprite: sprite in the hash
+        :param reach: rings of cells around the sprite to include
+        :param result: set that nearby sprites are added to
+        """
+        q, r = self.cell_of[sprite]
+        buckets = self.buckets
+        for dq, dr in self.ring_offsets(reach):
+            bucket = buckets.get((q + dq, r + dr), None)
+            if bucket:
+                result.update(bucket)
+        return result
 
 
 class PhysicsGroup(pygame.sprite.Group):
     def __init__(self, data):
+        self.spatial_hash = SpatialHash()
+        self._order = dict()
+        self._added = 0
+        self._touching = dict()
+        self._max_radius = 0
         super(PhysicsGroup, self).__init__()
         self.data = data
 
         self.gravity = Vector3(0, 0, config.getfloat('world', 'gravity'))
         self.timestep = config.getfloat('world', 'physics_tick')
+        self.time_scale = config.getfloat('world', 'time_scale')
+        self.max_substeps = config.getint('world', 'physics_max_substeps')
+
+        # real time not yet simulated, in simulated milliseconds
+        self.accumulator = 0.0
+
+        # how far between the last two ticks the current frame is, 0 to 1
+        self.alpha = 1.0
+
+        # positions of the sprites that were awake before the last tick
+        self.previous = dict()
+        # sprites the last tick moved by a distance that is blended
+        self._blended = None
         self.gravity_delta = None
         self.ground_friction = None
-        self.sleeping = set()
-        self.wake = set()
+        # sprites that are simulated; the rest sleep until woken
+        self.awake = ActiveSet(self._order)
+        # sprites moved by the ticks of the last update, awake or not
+        self.stepped = list()
         self.stale = set()
         self.collide_walls = set()
 
     def update(self, delta, scene):
-        stale = self.stale
+        """run as many fixed ticks as fit in the time since the last frame
+
+        :param delta: real milliseconds since the last update
+        """
+        timestep = self.timestep
+        del self.stepped[:]
+        self.accumulator += delta * self.time_scale
+        steps = 0
+        while self.accumulator >= timestep:
+            if steps == self.max_substeps:
+                # too far behind to catch up; let the world slow down
+                self.accumulator %= timestep
+                break
+            self.tick(scene)
+            self.accumulator -= timestep
+            steps += 1
+
+        alpha = self.accumulator / timestep
+        if steps == 0 and not alpha == self.alpha:
+            self.blend()
+        self.alpha = alpha
+
+    def blend(self):
+        """mark the sprites moved by the last tick as stepped and dirty
+
+        Called for frames without a tick, where only alpha changed, so
+        the sprites are drawn at their new blended positions.
+        """
+        blended = self._blended
+        if blended is None:
+            blended = list()
+            for sprite, (px, py, pz) in self.previous.items():
+                position = sprite.position
+                dx, dy = position.x - px, position.y - py
+                if dx * dx + dy * dy > 1:
+                    continue
+                if dx or dy or not position.z == pz:
+                    blended.append(sprite)
+            self._blended = blended
+
+        for sprite in blended:
+            sprite.dirty = 1
+        self.stepped.extend(blended)
+
+    def tick(self, scene):
+        """advance the world by one physics_tick
+        """
         delta = self.timestep
+        awake = self.awake.sprites()
+
+        # sprites moved outside of the physics step are woken
+        move = self.spatial_hash.move
+        max_radius = self._max_radius
+        previous = dict()
+        for sprite in awake:
+            move(sprite)
+            if sprite.radius > max_radius:
+                max_radius = sprite.radius
+            position = sprite.position
+            previous[sprite] = position.x, position.y, position.z
+        self._max_radius = max_radius
+        self.previous = previous
+        self._blended = None
+        self.stepped.extend(awake)
+        self.step(awake, delta, scene)
+
+    def interpolated_position(self, sprite):
+        """get the position of a sprite blended between the last two ticks
+
+        Sprites that jumped further than one unit, or were not moved by
+        the last tick, are not blended.
+
+        :return: (x, y, z) tuple
+        """
+        position = sprite.position
+        x, y, z = position.x, position.y, position.z
+        try:
+            px, py, pz = self.previous[sprite]
+        except KeyError:
+            return x, y, z
+
+        dx, dy, dz = x - px, y - py, z - pz
+        if dx * dx + dy * dy > 1:
+            return x, y, z
+
+        alpha = self.alpha
+        return px + dx * alpha, py + dy * alpha, pz + dz * alpha
+
+    def step(self, sprites, delta, scene):
+        """integrate awake sprites and raise collision events for them
+        """
         gravity_delta = self.gravity * delta
         ground_friction = pow(.9, delta)
+        move = self.spatial_hash.move
+        for sprite in sprites:
+            if self.integrate(sprite, delta, gravity_delta, ground_friction):
+                self.awake.sleep(sprite)
+                continue
+
+            move(sprite)
+            self.check_collisions(sprite, scene)
+
+    def integrate(self, sprite, delta, gravity_delta, ground_friction):
+        """move one sprite for one tick
+
+        :return: True if the sprite did not move and can sleep
+        """
+        sleeping = True
+        sprite.dirty = 1
+        acceleration = sprite.acceleration
+        position = sprite.position
+        velocity = sprite.velocity
+        max_velocity = sprite.max_velocity
+        check_walls = sprite in self.collide_walls
         collide = self.data.collidecircle
-        self.sleeping = self.sleeping - self.wake
-        self.wake = set()
-        all_sprites = self.sprites()
 
-        for sprite in set(self.sprites()) - self.sleeping:
-            sleeping = True
-            sprite.dirty = 1
-            acceleration = sprite.acceleration
-            position = sprite.position
-            velocity = sprite.velocity
-            max_velocity = sprite.max_velocity
-            check_walls = sprite in self.collide_walls
-
-            if not position.z == 0 and sprite.gravity:
-                acceleration += gravity_delta
-
-            velocity += acceleration * delta
-            dv = velocity * delta
-            if dv.z > 100:
-                dv.z = 100
-            x, y, z = dv
-
-            if not z == 0:
-                position.z += z
-                if position.z < 0:
-                    position.z = 0.0
-                    if abs(velocity.z) > .2:
-                        sprite.bounce_sound.play()
-                        sleeping = False
-                        acceleration.z = 0.0
-                        velocity.z = -velocity.z * .05
-                    else:
-                        position.z = 0.0
-                        acceleration.z = 0.0
-                        velocity.z = 0.0
-                else:
+        if not position.z == 0 and sprite.gravity:
+            acceleration += gravity_delta
+
+        velocity += acceleration * delta
+        dv = velocity * delta
+        if dv.z > 100:
+            dv.z = 100
+        x, y, z = dv
+
+        if not z == 0:
+            position.z += z
+            if position.z < 0:
+                position.z = 0.0
+                if abs(velocity.z) > .2:
+                    sprite.bounce_sound.play()
                     sleeping = False
+                    acceleration.z = 0.0
+                    velocity.z = -velocity.z * .05
+                else:
+                    position.z = 0.0
+                    acceleration.z = 0.0
+                    velocity.z = 0.0
+            else:
+                sleeping = False
 
-            if not x == 0:
-                if not position.z:
-                    velocity.x *= ground_friction
+        if not x == 0:
+            if not position.z:
+                velocity.x *= ground_friction
 
-                _collides = False
-                if check_walls:
-                    new_position = position + (x, 0, 0)
-                    axial = sprites_to_axial(new_position)
-                    _collides = collide(axial, sprite.radius)
+            _collides = False
+            if check_walls:
+                new_position = position + (x, 0, 0)
+                axial = sprites_to_axial(new_position)
+                _collides = collide(axial, sprite.radius)
 
-                if not _collides:
-                    sleeping = False
-                    position.x += x
+            if not _collides:
+                sleeping = False
+                position.x += x
 
-                if abs(round(x, 5)) < .005:
-                    acceleration.x = 0.0
-                    velocity.x = 0.0
+            if abs(round(x, 5)) < .005:
+                acceleration.x = 0.0
+                velocity.x = 0.0
 
-                if velocity.x > max_velocity[0]:
-                    velocity.x = max_velocity[0]
-                elif velocity.x < -max_velocity[0]:
-                    velocity.x = -max_velocity[0]
+            if velocity.x > max_velocity[0]:
+                velocity.x = max_velocity[0]
+            elif velocity.x < -max_velocity[0]:
+                velocity.x = -max_velocity[0]
 
-            if not y == 0:
-                if not position.z:
-                    velocity.y *= ground_friction
+        if not y == 0:
+            if not position.z:
+                velocity.y *= ground_friction
 
-                _collides = False
-                if check_walls:
-                    new_position = position + (0, y, 0)
-                    axial = sprites_to_axial(new_position)
-                    _collides = collide(axial, sprite.radius)
+            _collides = False
+            if check_walls:
+                new_position = position + (0, y, 0)
+                axial = sprites_to_axial(new_position)
+                _collides = collide(axial, sprite.radius)
 
-                if not _collides:
-                    sleeping = False
-                    position.y += y
+            if not _collides:
+                sleeping = False
+                position.y += y
+
+            if abs(round(y, 5)) < .005:
+                acceleration.y = 0.0
+                velocity.y = 0.0
 
-                if abs(round(y, 5)) < .005:
-                    acceleration.y = 0.0
-                    velocity.y = 0.0
+            if velocity.y > max_velocity[1]:
+                velocity.y = max_velocity[1]
+            elif velocity.y < -max_velocity[1]:
+                velocity.y = -max_velocity[1]
 
-                if velocity.y > max_velocity[1]:
-                    velocity.y = max_velocity[1]
-                elif velocity.y < -max_velocity[1]:
-                    velocity.y = -max_velocity[1]
+        return sleeping
 
-            if sleeping:
-                self.sleeping.add(sprite)
+    def check_collisions(self, sprite, scene):
+        """raise Collision and Separation events for a sprite that moved
+        """
+        stale = self.stale
+        axial = sprites_to_axial(sprite.position)
+        for other in self.collision_candidates(sprite):
+            if other is sprite:
                 continue
 
-            axial = sprites_to_axial(position)
-            for other in all_sprites:
-                if other is sprite:
-                    continue
+            collided = collide_hex(axial, sprites_to_axial(other.position),
+                                   sprite.radius, other.radius)
 
-                collided = collide_hex(axial, sprites_to_axial(other.position),
-                                       sprite.radius, other.radius)
+            t = (sprite, other)
+            if collided:
+                if t not in stale:
+                    stale.add(t)
+                    self._touch(sprite, other)
+                    self.awake.wake(other)
+                    scene.raise_contact("PhysicsGroup", "Collision",
+                                        sprite, other)
+            else:
+                if t in stale:
+                    stale.remove(t)
+                    self._touching[sprite].discard(other)
+                    scene.raise_contact(self, "Separation", sprite, other)
 
-                t = (sprite, other)
-                if collided:
-                    if t not in stale:
-                        stale.add(t)
-                        scene.raise_event("PhysicsGroup", "Collision",
-                                          left=sprite, right=other)
-                else:
-                    if t in stale:
-                        stale.remove(t)
-                        scene.raise_event(self, "Separation",
-                                          left=sprite, right=other)
+    def collision_candidates(self, sprite):
+        """get sprites that may collide or separate with a sprite
+
+        Sprites in nearby cells and sprites it was touching are returned,
+        in the order they were added to the group.
+        """
+        reach = cell_reach(sprite.radius + self._max_radius)
+        others = self.spatial_hash.query(sprite, reach, set())
+        others.update(self._touching.get(sprite, ()))
+        order = self._order
+        return sorted((other for other in others if other in order),
+                      key=order.__getitem__)
+
+    def _touch(self, sprite, other):
+        try:
+            self._touching[sprite].add(other)
+        except KeyError:
+            self._touching[sprite] = {other}
+
+    def add_internal(self, sprite, *args):
+        super(PhysicsGroup, self).add_internal(sprite, *args)
+        self._order[sprite] = self._added
+        self._added += 1
+        self.spatial_hash.add(sprite)
+        self.awake.wake(sprite)
+        if sprite.radius > self._max_radius:
+            self._max_radius = sprite.radius
+
+    def remove_internal(self, sprite):
+        super(PhysicsGroup, self).remove_internal(sprite)
+        self.awake.sleep(sprite)
+        del self._order[sprite]
+        self.spatial_hash.remove(sprite)
+        self.previous.pop(sprite, None)
+        self._blended = None
+        if sprite.radius >= self._max_radius:
+            self._max_radius = max([i.radius for i in self.sprites()] or [0])
 
     def wake_sprite(self, sprite):
-        assert (sprite in self.sprites())
-        self.wake.add(sprite)
+        assert (sprite in self._order)
+        self.awake.wake(sprite)
+
+
+class BatchPhysicsGroup(PhysicsGroup):
+    """PhysicsGroup that moves all awake sprites at once with numpy
+
+    Each tick the state of the awake sprites is copied into arrays, with
+    one row per sprite, and gravity, friction, clamping and bouncing are
+    done on whole columns.  Only sprites that changed are written back.
+
+    Sprites that collide with walls are still moved one at a time, since
+    each step has to be tested against the map.  Collision events are
+    raised after every sprite has moved.
+
+    Requires numpy.
+    """
+    # columns of the state array
+    position_columns = slice(0, 3)
+    velocity_columns = slice(3, 6)
+    acceleration_columns = slice(6, 9)
+    state_width = 12
+
+    def __init__(self, data):
+        if numpy is None:
+            raise RuntimeError("BatchPhysicsGroup requires numpy")
+        super(BatchPhysicsGroup, self).__init__(data)
+
+    def step(self, sprites, delta, scene):
+        walled = list()
+        batch = list()
+        collide_walls = self.collide_walls
+        for sprite in sprites:
+            if sprite in collide_walls:
+                walled.append(sprite)
+            else:
+                batch.append(sprite)
+
+        super(BatchPhysicsGroup, self).step(walled, delta, scene)
+        if not batch:
+            return
+
+        move = self.spatial_hash.move
+        for sprite in self.integrate_batch(batch, delta):
+            move(sprite)
+            self.check_collisions(sprite, scene)
+
+    def gather(self, sprites):
+        """copy position, velocity, acceleration, max velocity and gravity
+        of sprites into a state array
+        """
+        values = list()
+        extend = values.extend
+        for sprite in sprites:
+            p = sprite.position
+            v = sprite.velocity
+            a = sprite.acceleration
+            m = sprite.max_velocity
+            extend((p.x, p.y, p.z, v.x, v.y, v.z, a.x, a.y, a.z,
+                    m[0], m[1], sprite.gravity))
+        state = numpy.array(values, dtype=float)
+        return state.reshape(len(sprites), self.state_width)
+
+    def integrate_batch(self, sprites, delta):
+        """move sprites for one tick
+
+        Sprites that stopped are put to sleep.
+
+        :return: list of sprites that moved
+        """
+        np = numpy
+        before = self.gather(sprites)
+        state = before.copy()
+        position = state[:, self.position_columns]
+        velocity = state[:, self.velocity_columns]
+        acceleration = state[:, self.acceleration_columns]
+        max_velocity = state[:, 9:11]
+        gravity = state[:, 11] != 0
+        awake = np.zeros(len(sprites), dtype=bool)
+
+        falling = gravity & (position[:, 2] != 0)
+        acceleration[falling, 2] += self.gravity.z * delta
+
+        velocity += acceleration * delta
+        dv = velocity * delta
+        np.minimum(dv[:, 2], 100, out=dv[:, 2])
+
+        # drop, bouncing on the ground
+        dz = dv[:, 2]
+        moving = dz != 0
+        position[moving, 2] += dz[moving]
+        landed = moving & (position[:, 2] < 0)
+        bounced = landed & (np.abs(velocity[:, 2]) > .2)
+        position[landed, 2] = 0.0
+        acceleration[landed, 2] = 0.0
+        velocity[bounced, 2] *= -.05
+        velocity[landed & ~bounced, 2] = 0.0
+        awake |= bounced | (moving & ~landed)
+
+        # slide, with friction on the ground
+        grounded = position[:, 2] == 0
+        ground_friction = pow(.9, delta)
+        for axis in (0, 1):
+            d = dv[:, axis]
+            moving = d != 0
+            velocity[moving & grounded, axis] *= ground_friction
+            position[moving, axis] += d[moving]
+            awake |= moving
+
+            stopped = moving & (np.abs(np.round(d, 5)) < .005)
+            acceleration[stopped, axis] = 0.0
+            velocity[stopped, axis] = 0.0
+
+            limit = max_velocity[:, axis]
+            np.clip(velocity[:, axis], -limit, limit,
+                    out=velocity[:, axis], where=moving)
+
+        for i in np.flatnonzero(bounced):
+            sprites[i].bounce_sound.play()
+
+        # write back only the sprites that changed
+        changed = np.any(state[:, :9] != before[:, :9], axis=1)
+        rows = state.tolist()
+        for i in np.flatnonzero(changed):
+            sprite = sprites[i]
+            row = rows[i]
+            p = sprite.position
+            v = sprite.velocity
+            a = sprite.acceleration
+            p.x, p.y, p.z = row[0:3]
+            v.x, v.y, v.z = row[3:6]
+            a.x, a.y, a.z = row[6:9]
+
+        moved = list()
+        sleep = self.awake.sleep
+        for sprite, is_awake in zip(sprites, awake.tolist()):
+            sprite.dirty = 1
+            if is_awake:
+                moved.append(sprite)
+            else:
+                sleep(sprite)
+        return moved
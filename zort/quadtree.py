@@ -1,7 +1,8 @@
 """
-Two classes for quadtree collision detection.
+Classes for quadtree collision detection.
 
-A quadtree is used with pyscroll to detect overlapping tiles.
+A quadtree is used with pyscroll to detect overlapping tiles.  The
+DynamicQuadTree can be changed after it is made, for things that move.
 """
 
 from pygame import Rect
@@ -156,3 +157,232 @@ class FastQuadTree(object):
             hits |= self.se.hit_rect(rect)
 
         return hits
+
+
+class _QuadNode(object):
+    __slots__ = ['parent', 'depth', 'left', 'top', 'right', 'bottom',
+                 'cx', 'cy', 'items', 'children', 'count']
+
+    def __init__(self, parent, depth, left, top, right, bottom):
+        self.parent = parent
+        self.depth = depth
+        self.left = left
+        self.top = top
+        self.right = right
+        self.bottom = bottom
+        self.cx = (left + right) // 2
+        self.cy = (top + bottom) // 2
+        self.items = []
+        self.children = None
+
+        # number of items in this node and every node below it
+        self.count = 0
+
+
+class DynamicQuadTree(object):
+    """A quad-tree that items can be added to, removed from and moved in.
+
+    Each item is kept in the smallest node that holds its whole rect, so
+    it is never stored twice.  A node is split when it holds more than
+    max_items, and the nodes below it are merged back into it when they
+    hold min_items or less together.  Items outside of the boundary are
+    kept in the top node.
+
+    Items can be any hashable object, and are returned from a query, not
+    a tuple or rect that describes them.
+    """
+
+    def __init__(self, boundary, max_items=8, min_items=4, max_depth=8):
+        """Creates an empty quad-tree.
+
+        @param boundary:
+            The area most items will be in.
+
+        @param max_items:
+            Number of items a node can hold before it is split.
+
+        @param min_items:
+            The nodes below a node are merged when they hold this many
+            items or less.
+
+        @param max_depth:
+            Nodes this deep are never split.
+        """
+        boundary = Rect(boundary)
+        self.max_items = max_items
+        self.min_items = min_items
+        self.max_depth = max_depth
+        self.root = _QuadNode(None, 0, boundary.left, boundary.top,
+                              boundary.right, boundary.bottom)
+        self._rects = dict()
+        self._node_of = dict()
+        self._stack = []
+
+    def __len__(self):
+        return len(self._rects)
+
+    def __contains__(self, item):
+        return item in self._rects
+
+    def __iter__(self):
+        return iter(self._rects)
+
+    def _child(self, node, rect):
+        """Returns the quadrant of node that holds all of rect, or None."""
+        if rect.left < node.left or rect.top < node.top or \
+                rect.right > node.right or rect.bottom > node.bottom:
+            return None
+        if rect.right <= node.cx:
+            i = 0
+        elif rect.left >= node.cx:
+            i = 1
+        else:
+            return None
+        if rect.bottom <= node.cy:
+            return node.children[i]
+        elif rect.top >= node.cy:
+            return node.children[i + 2]
+        return None
+
+    def insert(self, item, rect=None):
+        """Adds an item.
+
+        @param rect:
+            The rect of the item; if None, the .rect of the item is used.
+        """
+        if item in self._rects:
+            self.remove(item)
+        rect = Rect(item.rect if rect is None else rect)
+        self._rects[item] = rect
+        self._place(item, rect, self.root)
+
+    def _place(self, item, rect, node):
+        while True:
+            node.count += 1
+            if node.children is None:
+                break
+            child = self._child(node, rect)
+            if child is None:
+                break
+            node = child
+
+        node.items.append(item)
+        self._node_of[item] = node
+        if node.children is None and len(node.items) > self.max_items:
+            self._split(node)
+
+    def _split(self, node):
+        if node.depth >= self.max_depth:
+            return
+
+        depth = node.depth + 1
+        left, top, right, bottom = node.left, node.top, node.right, node.bottom
+        cx, cy = node.cx, node.cy
+        node.children = [_QuadNode(node, depth, left, top, cx, cy),
+                         _QuadNode(node, depth, cx, top, right, cy),
+                         _QuadNode(node, depth, left, cy, cx, bottom),
+                         _QuadNode(node, depth, cx, cy, right, bottom)]
+
+        items = node.items
+        node.items = []
+        rects = self._rects
+        node_of = self._node_of
+        for item in items:
+            child = self._child(node, rects[item])
+            if child is None:
+                node.items.append(item)
+            else:
+                child.items.append(item)
+                child.count += 1
+                node_of[item] = child
+
+        for child in node.children:
+            if len(child.items) > self.max_items:
+                self._split(child)
+
+    def remove(self, item):
+        """Removes an item."""
+        node = self._node_of.pop(item)
+        del self._rects[item]
+        node.items.remove(item)
+
+        top = None
+        while node is not None:
+            node.count -= 1
+            if node.children is not None and node.count <= self.min_items:
+                top = node
+            node = node.parent
+
+        if top is not None:
+            self._merge(top)
+
+    def _merge(self, node):
+        node_of = self._node_of
+        stack = list(node.children)
+        node.children = None
+        while stack:
+            child = stack.pop()
+            for item in child.items:
+                node.items.append(item)
+                node_of[item] = node
+            if child.children is not None:
+                stack.extend(child.children)
+
+    def move(self, item, rect=None):
+        """Updates the rect of an item that was added before.
+
+        The item is only moved to another node if it no longer fits in
+        its node, or now fits in a smaller one.
+
+        @param rect:
+            The new rect; if None, the .rect of the item is used.
+        """
+        rect = Rect(item.rect if rect is None else rect)
+        node = self._node_of[item]
+        old = self._rects[item]
+        if rect == old:
+            return
+        self._rects[item] = rect
+
+        fits = node.parent is None or not (
+            rect.left < node.left or rect.top < node.top or
+            rect.right > node.right or rect.bottom > node.bottom)
+        if fits and (node.children is None or
+                     self._child(node, rect) is None):
+            return
+
+        self._rects[item] = old
+        self.remove(item)
+        self.insert(item, rect)
+
+    def rect_of(self, item):
+        return self._rects[item]
+
+    def query(self, rect, result):
+        """Appends the items that overlap a rectangle to a list.
+
+        Nothing is allocated, so this is cheap to call every frame with
+        the same list.  Items are only added once.
+
+        @param rect:
+            The rectangle being tested against the quad-tree.
+
+        @param result:
+            The list that items are appended to.
+        """
+        rects = self._rects
+        stack = self._stack
+        stack.append(self.root)
+        left, top, right, bottom = rect.left, rect.top, rect.right, rect.bottom
+        while stack:
+            node = stack.pop()
+            for item in node.items:
+                if rect.colliderect(rects[item]):
+                    result.append(item)
+            if node.children is not None:
+                for child in node.children:
+                    if child.count and child.left < right and \
+                            left < child.right and child.top < bottom and \
+                            top < child.bottom:
+                        stack.append(child)
+        return result
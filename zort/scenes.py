@@ -8,6 +8,8 @@ from pygame.display import flip, update, set_caption
 from pygame.draw import rect as draw_rect
 
 from zort import config
+from zort.dirtyrects import DirtyRects
+from zort.events import EventBus
 
 
 class Game(object):
@@ -18,6 +20,9 @@ class Game(object):
         self.target_fps = target_fps
         self.clock = Clock()
         self.main_surface = main_surface
+        self.dirty_rects = DirtyRects(
+            main_surface.get_rect(),
+            config.getfloat('display', 'full_update_ratio'))
 
     def register_scene(self, scene):
         self.scenes[scene.name] = scene
@@ -46,6 +51,7 @@ class Game(object):
         fps_display_acc = 0
         get_fps = self.clock.get_fps
         poll_event = event.poll
+        dirty_rects = self.dirty_rects
 
         while len(self.scene_stack) > 0:
             events = list()
@@ -63,7 +69,9 @@ class Game(object):
 
             fps_display_acc += delta
             if fps_display_acc >= 10000:
-                set_caption("FPS ::: %.4f" % fps)
+                set_caption("FPS ::: %.4f  rects %d  pixels %d" %
+                            (fps, dirty_rects.rect_count,
+                             dirty_rects.covered))
                 fps_display_acc = 0
 
             self.current_scene.update_events()
@@ -77,11 +85,15 @@ class Game(object):
                 draw_timer -= draw_interval
                 self.current_scene.clear(main_surface)
                 dirty = self.current_scene.draw(main_surface)
+                if dirty is not None:
+                    dirty = dirty_rects.merge(dirty)
 
                 if DEBUG:
                     for rect in dirty:
                         draw_rect(main_surface, (0, 255, 0), rect, 1)
                         flip()
+                elif dirty is not None and dirty_rects.full:
+                    flip()
                 else:
                     update(dirty)
 
@@ -90,8 +102,7 @@ class Scene(object):
     def __init__(self, name, game):
         self.game = game
         self.name = name
-        self.state = {"events": {}}
-        # events are stored as {"event-name": list of kwargs dicts}
+        self.events = EventBus()
 
     def setup(self):
         raise NotImplemented("Not implemented by subclass")
@@ -112,28 +123,13 @@ class Scene(object):
         pass
 
     def raise_event(self, originator, event_name, **kwargs):
-        event = dict(kwargs)
-        event["originator"] = originator
-        event["frames_left"] = 2
-        try:
-            events = self.state["events"][event_name]
-        except KeyError:
-            events = list()
-            self.state['events'][event_name] = events
-        finally:
-            events.append(event)
+        return self.events.raise_event(originator, event_name, **kwargs)
 
-    def update_events(self):
-        events = self.state["events"]
-        for event_type, event_list in events.items():
-            dead = list()
-            for e in event_list:
-                e["frames_left"] -= 1
-                if e["frames_left"] <= 0:
-                    dead.append(e)
+    def raise_contact(self, originator, event_name, left, right):
+        return self.events.raise_contact(originator, event_name, left, right)
 
-            for e in dead:
-                event_list.remove(e)
+    def update_events(self):
+        self.events.advance()
 
     def clear_events(self):
-        self.state["events"] = dict()
+        self.events.clear()
@@ -0,0 +1,197 @@
+"""
+Scaled hex tiles packed into one surface, for HexMapView.
+
+Tiles are scaled to the size of a hex the first time they are used, and
+copied into a shared atlas surface.  An atlas is made for each
+(hex_radius, tilt, size_ratio) and can be saved to disk, so the next
+launch loads the scaled tiles instead of scaling them again.
+"""
+
+from math import sqrt
+import json
+import logging
+import os
+
+import pygame
+from pygame.transform import smoothscale
+
+from zort import resources
+
+logger = logging.getLogger('zort.tileatlas')
+
+__all__ = ['TileAtlas', 'get_atlas', 'save_all']
+
+# atlases by (hex_radius, tilt, size_ratio)
+_atlases = dict()
+
+
+def get_atlas(hex_radius, tilt, size_ratio, path=None):
+    """get the shared atlas for a tile size, loading it from disk once
+
+    :param path: folder the atlas is saved to, or None to not save it
+    """
+    key = hex_radius, tilt, size_ratio
+    try:
+        return _atlases[key]
+    except KeyError:
+        atlas = TileAtlas(hex_radius, tilt, size_ratio, path)
+        atlas.load()
+        _atlases[key] = atlas
+        return atlas
+
+
+def save_all():
+    """save every atlas that has tiles not yet on disk
+    """
+    for atlas in _atlases.values():
+        if atlas.dirty:
+            atlas.save()
+
+
+class TileAtlas(object):
+    """scaled tiles for one hex size, packed into columns of one surface
+
+    :param hex_radius: radius of a hex in pixels
+    :param tilt: vertical squash of a hex
+    :param size_ratio: part of the key only; it does not change tiles
+    :param path: folder the atlas is saved to, or None to not save it
+    """
+    max_height = 1024
+
+    def __init__(self, hex_radius, tilt, size_ratio, path=None):
+        self.key = hex_radius, tilt, size_ratio
+        self.path = path
+        self.surface = None
+        self.rects = dict()
+        self.dirty = False
+        self._images = dict()
+
+        ph = hex_radius * 2
+        self.tile_width = sqrt(3) / 2 * ph + 1
+        self._column_width = int(self.tile_width)
+        self._x = 0
+        self._y = 0
+
+    def __contains__(self, filename):
+        return filename in self.rects
+
+    def __getitem__(self, filename):
+        """get the scaled tile for a filename, scaling it if needed
+        """
+        try:
+            return self._images[filename]
+        except KeyError:
+            self.add(filename, self.scale(resources.tiles[filename]))
+            return self._images[filename]
+
+    @property
+    def filename(self):
+        name = 'atlas-%s-%s-%s' % self.key
+        return os.path.join(self.path, name)
+
+    def require(self, filenames):
+        """scale the tiles that are not in the atlas yet
+
+        :return: number of tiles that were scaled
+        """
+        missing = [f for f in sorted(set(filenames)) if f not in self.rects]
+        for filename in missing:
+            self.add(filename, self.scale(resources.tiles[filename]))
+        return len(missing)
+
+    def scale(self, image):
+        pw = self.tile_width
+        iw, ih = image.get_size()
+        height = pw * (float(ih) / iw)
+        return smoothscale(image, (int(pw), int(height)))
+
+    def add(self, filename, image):
+        """copy a scaled tile into the atlas
+        """
+        w, h = image.get_size()
+        if self._y and self._y + h > self.max_height:
+            self._x += self._column_width
+            self._y = 0
+
+        rect = pygame.Rect(self._x, self._y, w, h)
+        self._y += h
+        self._reserve(rect)
+        self.surface.blit(image, rect)
+        self.rects[filename] = rect
+        self._images[filename] = self.surface.subsurface(rect)
+        self.dirty = True
+
+    def _reserve(self, rect):
+        """grow the atlas surface so it holds rect
+        """
+        if self.surface is not None:
+            width, height = self.surface.get_size()
+            if rect.right <= width and rect.bottom <= height:
+                return
+        else:
+            width = height = 0
+
+        width = max(width, rect.right)
+        height = max(height, min(self.max_height, height * 2), rect.bottom)
+        surface = pygame.Surface((width, height), pygame.SRCALPHA)
+        if self.surface is not None:
+            surface.blit(self.surface, (0, 0))
+        self.surface = surface
+
+        # subsurfaces are views of the old surface
+        self._images = dict((filename, surface.subsurface(rect))
+                            for filename, rect in self.rects.items())
+
+    def save(self):
+        """write the atlas image and the rect of every tile
+        """
+        if self.path is None or self.surface is None:
+            return
+
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+            pygame.image.save(self.surface, self.filename + '.png')
+            index = {
+                'column': [self._x, self._y],
+                'rects': dict((k, list(v)) for k, v in self.rects.items()),
+                'sources': dict((k, list(resources.tiles[k].get_size()))
+                                for k in self.rects)}
+            with open(self.filename + '.json', 'w') as fp:
+                json.dump(index, fp)
+            self.dirty = False
+        except (IOError, OSError, pygame.error):
+            logger.warning("cannot save tile atlas %s", self.filename)
+
+    def load(self):
+        """read a saved atlas, if there is one
+
+        :return: True if it was loaded
+        """
+        if self.path is None:
+            return False
+
+        try:
+            with open(self.filename + '.json') as fp:
+                index = json.load(fp)
+            surface = pygame.image.load(self.filename + '.png')
+        except (IOError, OSError, ValueError, pygame.error):
+            return False
+
+        # tiles were changed since the atlas was saved
+        for filename, size in index['sources'].items():
+            image = resources.tiles.get(filename, None)
+            if image is None or not list(image.get_size()) == size:
+                return False
+
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert_alpha()
+        self.surface = surface
+        self.rects = dict((k, pygame.Rect(v))
+                          for k, v in index['rects'].items())
+        self._x, self._y = index['column']
+        self._images = dict((filename, surface.subsurface(rect))
+                            for filename, rect in self.rects.items())
+        self.dirty = False
+        logger.info("loaded tile atlas %s", self.filename)
+        return True
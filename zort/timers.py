@@ -0,0 +1,148 @@
+"""
+Timers of a scene, kept in one heap ordered by deadline.
+
+Each frame the scene calls Scheduler.update with the time that passed.
+Only the timers that are due are looked at, so a frame where no timer
+fires costs one comparison, however many timers are waiting.
+
+Cancelled timers are left in the heap and skipped when they come up; the
+heap is rebuilt without them once they are most of it.
+"""
+
+from heapq import heappush, heappop, heapify
+
+__all__ = ['Timer', 'Scheduler']
+
+
+class Timer(object):
+    """callback that is run after some time, once or more
+
+    :param callback: called with args and kwargs when the timer fires
+    :param interval: milliseconds between adding the timer and firing,
+                     and between firings
+    :param loops: number of times to fire, or -1 to fire until cancelled
+
+    If owner is set, owner.wake() is called before the callback.
+    """
+    __slots__ = ('callback', 'interval', 'loops', 'args', 'kwargs',
+                 'owner', 'deadline', 'scheduler', '_seq')
+
+    def __init__(self, callback, interval=0, loops=1, args=None,
+                 kwargs=None):
+        assert (callable(callback))
+        assert (loops >= -1)
+        self.callback = callback
+        self.interval = interval
+        self.loops = loops
+        self.args = args if args else list()
+        self.kwargs = kwargs if kwargs else dict()
+        self.owner = None
+        self.deadline = None
+        self.scheduler = None
+        self._seq = None
+
+    @property
+    def active(self):
+        """True while the timer is in a scheduler and will fire again
+        """
+        return self.scheduler is not None
+
+    def cancel(self):
+        scheduler = self.scheduler
+        if scheduler is not None:
+            self.scheduler = None
+            if self._seq is not None:
+                scheduler._stale += 1
+
+
+class Scheduler(object):
+    """timers of one scene, fired in deadline order
+
+    Timers with the same deadline fire in the order they were added.  A
+    repeating timer fires at most once in each update; if it fell behind,
+    it keeps its deadlines and catches up in the next updates.
+    """
+
+    def __init__(self):
+        self.time = 0
+        self._heap = list()
+        self._seq = 0
+        # entries of cancelled timers still in the heap
+        self._stale = 0
+
+    def __len__(self):
+        return len(self._heap) - self._stale
+
+    def _push(self, timer):
+        self._seq += 1
+        timer._seq = self._seq
+        heappush(self._heap, (timer.deadline, self._seq, timer))
+
+    def add(self, timer):
+        """start a timer, which fires after its interval
+
+        :return: the timer
+        """
+        timer.cancel()
+        timer.scheduler = self
+        timer.deadline = self.time + timer.interval
+        self._push(timer)
+        return timer
+
+    def schedule(self, callback, interval=0, loops=1, args=None,
+                 kwargs=None):
+        """make a Timer and start it
+
+        :return: the timer, which can be cancelled
+        """
+        return self.add(Timer(callback, interval, loops, args, kwargs))
+
+    def clear(self):
+        for deadline, seq, timer in self._heap:
+            if timer.scheduler is self and timer._seq == seq:
+                timer.scheduler = None
+        del self._heap[:]
+        self._stale = 0
+
+    def update(self, delta):
+        """advance the time and fire the timers that are due
+        """
+        self.time = now = self.time + delta
+        heap = self._heap
+        if not heap or heap[0][0] > now:
+            return
+
+        fired = list()
+        while heap and heap[0][0] <= now:
+            deadline, seq, timer = heappop(heap)
+            if timer.scheduler is not self or not timer._seq == seq:
+                self._stale -= 1
+                continue
+
+            timer._seq = None
+            if 0 <= timer.loops <= 1:
+                timer.loops = 0
+                timer.scheduler = None
+            else:
+                if timer.loops > 1:
+                    timer.loops -= 1
+                timer.deadline = deadline + timer.interval
+                fired.append(timer)
+            if timer.owner is not None:
+                timer.owner.wake()
+            timer.callback(*timer.args, **timer.kwargs)
+
+        # repeating timers are put back after, so each fires only once
+        for timer in fired:
+            if timer.scheduler is self:
+                self._push(timer)
+
+        if self._stale > 64 and self._stale * 2 > len(heap):
+            self._compact()
+
+    def _compact(self):
+        self._heap = [entry for entry in self._heap
+                      if entry[2].scheduler is self and
+                      entry[2]._seq == entry[1]]
+        heapify(self._heap)
+        self._stale = 0